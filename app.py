@@ -4,7 +4,8 @@ This file is used for execution of back end server.
 
 Author: xkloco00@stud.fit.vutbr.cz
 """
-from app import app
-
 if __name__ == '__main__':
+    # import is guarded, spawned worker processes import this file again and must not load the application
+    from app import app
+
     app.run(port=42024, host='0.0.0.0')
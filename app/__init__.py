@@ -12,12 +12,19 @@ import sys, secrets
 sys.path.append('../')
 
 from review_analysis.utils.elastic_connector import Connector
+from . import config
 from .controllers.ProductController import ProductController
 from .controllers.GenerateDataController import GenerateDataController
 from .controllers.DataController import DataController
 from .controllers.ExperimentClusterController import ExperimentClusterController
 from .controllers.ReviewExperimentController import ReviewController
 from .controllers.UserController import UserController
+from .utils.ImageFetcher import ImageFetcher
+from .utils.LemmaStore import LemmaStore
+from .utils.SentenceEmbedder import SentenceEmbedder
+from .utils.TTLCache import TTLCache
+from .utils.InferenceCache import InferenceCache
+from .utils.ReviewWriter import ReviewWriter
 
 flask_app = Flask(__name__)
 CORS(flask_app)
@@ -34,11 +41,43 @@ app = Api(app=flask_app,
 
 es_con = Connector()
 generate_cnt = GenerateDataController(es_con)
-data_cnt = DataController(es_con)
-experiment_cluster_cnt = ExperimentClusterController(es_con)
-review_cnt = ReviewController(es_con)
-product_cnt = ProductController(es_con)
-user_cnt = UserController(es_con)
+data_cnt = DataController(es_con, product_index=config.PRODUCT_INDEX,
+                          check_interval=config.BREADCRUMBS_CHECK_INTERVAL)
+# salient lemmas of category experiments, shared by review analysis and experiment CRUD, which invalidates it
+salient_cache = TTLCache(ttl=config.SALIENT_CACHE_TTL)
+embedder = None
+if config.EMBEDDING_CACHE_DIR:
+    embedder = SentenceEmbedder(config.EMBEDDING_MODEL_PATHS, config.EMBEDDING_CACHE_DIR)
+experiment_cluster_cnt = ExperimentClusterController(es_con, workers=config.CLUSTER_WORKERS,
+                                                     max_pending=config.CLUSTER_MAX_PENDING,
+                                                     bulk_chunk_size=config.BULK_CHUNK_SIZE,
+                                                     lemma_store=LemmaStore(config.LEMMA_STORE_PATH),
+                                                     tagger_workers=config.TAGGER_WORKERS,
+                                                     tagger_chunk_size=config.TAGGER_CHUNK_SIZE,
+                                                     embedder=embedder,
+                                                     memory_cap=config.CLUSTER_MEMORY_CAP,
+                                                     max_landmarks=config.CLUSTER_MAX_LANDMARKS,
+                                                     sample_size=config.CLUSTER_SAMPLE_SIZE,
+                                                     salient_cache=salient_cache)
+review_writer = None
+if config.REVIEW_WRITE_BACK:
+    review_writer = ReviewWriter(es_con, config.DOMAIN_INDEXES + [config.SHOP_REVIEW_INDEX])
+scheduler_config = None
+if config.INFERENCE_SCHEDULER:
+    scheduler_config = dict(config.INFERENCE_SCHEDULER_MODELS)
+    scheduler_config['default'] = {'max_batch': config.MODEL_BATCH_SIZE, 'max_wait_ms': config.INFERENCE_MAX_WAIT_MS}
+review_cnt = ReviewController(es_con, batch_size=config.MODEL_BATCH_SIZE,
+                              memory_budget=config.MODEL_MEMORY_BUDGET, path=config.MODEL_PATH,
+                              salient_cache=salient_cache,
+                              inference_cache=InferenceCache(config.INFERENCE_CACHE_PATH,
+                                                             memory_size=config.INFERENCE_CACHE_SIZE),
+                              review_writer=review_writer, scheduler_config=scheduler_config,
+                              quantized=config.QUANTIZED_MODELS)
+image_fetcher = ImageFetcher(config.IMAGE_CACHE_PATH, ttl=config.IMAGE_CACHE_TTL,
+                             negative_ttl=config.IMAGE_CACHE_NEGATIVE_TTL, workers=config.IMAGE_FETCH_WORKERS)
+product_cnt = ProductController(es_con, product_index=config.PRODUCT_INDEX,
+                                check_interval=config.BREADCRUMBS_CHECK_INTERVAL, image_fetcher=image_fetcher)
+user_cnt = UserController(es_con, cache_ttl=config.USER_CACHE_TTL, cache_size=config.USER_CACHE_SIZE)
 
 from app import routes
 
@@ -0,0 +1,93 @@
+"""
+This file contains configuration of back end application. Every value can be overridden by environment variable with
+the same name.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import json
+import os
+
+# path to directory with trained models
+MODEL_PATH = os.environ.get('MODEL_PATH', '../model/')
+# domain categories, each has its own index of product reviews and domain bipolar model
+DOMAIN_INDEXES = os.environ.get('DOMAIN_INDEXES', ','.join([
+    'elektronika',
+    'bile_zbozi',
+    'dum_a_zahrada',
+    'chovatelstvi',
+    'auto-moto',
+    'detske_zbozi',
+    'obleceni_a_moda',
+    'filmy_knihy_hry',
+    'kosmetika_a_zdravi',
+    'sport',
+    'hobby',
+    'jidlo_a_napoje',
+    'stavebniny',
+    'sexualni_a_eroticke_pomucky',
+])).split(',')
+# index of shop reviews
+SHOP_REVIEW_INDEX = os.environ.get('SHOP_REVIEW_INDEX', 'shop_review')
+# count of sentences evaluated by bert model in one forward pass
+MODEL_BATCH_SIZE = int(os.environ.get('MODEL_BATCH_SIZE', 32))
+# memory budget in bytes for lazily loaded domain bert models, 0 means unlimited (all models stay resident), budget
+# smaller than size of all domain models makes /experiment/review reload evicted models on every request
+MODEL_MEMORY_BUDGET = int(os.environ.get('MODEL_MEMORY_BUDGET', 0))
+# count of clustering experiments executed concurrently in background
+CLUSTER_WORKERS = int(os.environ.get('CLUSTER_WORKERS', 1))
+# maximum count of queued and running clustering experiments
+CLUSTER_MAX_PENDING = int(os.environ.get('CLUSTER_MAX_PENDING', 8))
+# maximum size in bytes of clustering feature matrix, with EMBEDDING_CACHE_DIR larger experiments are clustered blockwise
+# by mini-batch k-means, FastText model always builds dense matrix and exceeding the cap is only reported
+CLUSTER_MEMORY_CAP = int(os.environ.get('CLUSTER_MEMORY_CAP', 1024 ** 3))
+# maximum count of landmark sentences approximating rows of distance/similarity matrix in blockwise clustering
+CLUSTER_MAX_LANDMARKS = int(os.environ.get('CLUSTER_MAX_LANDMARKS', 2048))
+# default size of stratified sample clustered in experiments, the rest is assigned to the nearest cluster, 0 disables,
+# sampling requires EMBEDDING_CACHE_DIR
+CLUSTER_SAMPLE_SIZE = int(os.environ.get('CLUSTER_SAMPLE_SIZE', 0))
+# count of documents sent to elasticsearch in one bulk request
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 500))
+# comma separated names of bert models (general, regression, domain names or all) served with int8 quantization
+QUANTIZED_MODELS = [name for name in os.environ.get('QUANTIZED_MODELS', '').split(',') if name]
+# coalesce sentences of concurrent requests into batches per model, 0 evaluates single sentences (text rating,
+# sentence polarity) by eval_example of model and sentences of review in batches per request
+INFERENCE_SCHEDULER = os.environ.get('INFERENCE_SCHEDULER', '1') == '1'
+# maximum count of milliseconds the first sentence of batch waits for sentences of other requests
+INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 2))
+# json dictionary of model name -> {"max_batch": int, "max_wait_ms": float} overriding scheduler defaults
+INFERENCE_SCHEDULER_MODELS = json.loads(os.environ.get('INFERENCE_SCHEDULER_MODELS', '{}'))
+# path to sqlite store of model outputs of cleared sentences
+INFERENCE_CACHE_PATH = os.environ.get('INFERENCE_CACHE_PATH', 'inference_cache.sqlite')
+# maximum count of model outputs cached in memory in front of sqlite store
+INFERENCE_CACHE_SIZE = int(os.environ.get('INFERENCE_CACHE_SIZE', 100000))
+# write analyses computed by /experiment/review back to review documents in background
+REVIEW_WRITE_BACK = os.environ.get('REVIEW_WRITE_BACK', '1') == '1'
+# time to live in seconds of cached salient lemmas of category experiments, changes made by this app invalidate it
+SALIENT_CACHE_TTL = float(os.environ.get('SALIENT_CACHE_TTL', 600))
+# time to live in seconds of users cached for token verification
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 300))
+# maximum count of users cached for token verification
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+# name of index with products, its changes rebuild breadcrumbs trees
+PRODUCT_INDEX = os.environ.get('PRODUCT_INDEX', 'product')
+# minimal count of seconds between checks of product index changes
+BREADCRUMBS_CHECK_INTERVAL = float(os.environ.get('BREADCRUMBS_CHECK_INTERVAL', 60))
+# path to persistent cache of products image urls
+IMAGE_CACHE_PATH = os.environ.get('IMAGE_CACHE_PATH', 'image_cache.sqlite')
+# time to live in seconds of cached image url
+IMAGE_CACHE_TTL = float(os.environ.get('IMAGE_CACHE_TTL', 7 * 24 * 3600))
+# time to live in seconds of cached missing image
+IMAGE_CACHE_NEGATIVE_TTL = float(os.environ.get('IMAGE_CACHE_NEGATIVE_TTL', 24 * 3600))
+# count of concurrent downloads of products pages
+IMAGE_FETCH_WORKERS = int(os.environ.get('IMAGE_FETCH_WORKERS', 8))
+# path to persistent store of pos tagged review sentences
+LEMMA_STORE_PATH = os.environ.get('LEMMA_STORE_PATH', 'lemma_store.sqlite')
+# count of processes for pos tagging of reviews in clustering experiments, 1 disables parallel tagging, CPUs are
+# shared with bert models serving requests
+TAGGER_WORKERS = int(os.environ.get('TAGGER_WORKERS', 2))
+# count of sentences sent to tagging process at once
+TAGGER_CHUNK_SIZE = int(os.environ.get('TAGGER_CHUNK_SIZE', 256))
+# directory of memory mapped cache of mean word vector sentence embeddings, empty clusters sentences by FastText model
+EMBEDDING_CACHE_DIR = os.environ.get('EMBEDDING_CACHE_DIR', '')
+# json dictionary of embedding model -> path to FastText .bin or gensim KeyedVectors file, required with embedding cache
+EMBEDDING_MODEL_PATHS = json.loads(os.environ.get('EMBEDDING_MODEL_PATHS', '{}'))
@@ -8,13 +8,28 @@ Author: xkloco00@stud.fit.vutbr.cz
 import datetime
 import sys
 
+from review_analysis.utils.elastic_connector import Connector
 from .Controller import Controller
+from app.utils.DocumentCache import DocumentCache
+from app.utils.TreeIndex import TreeIndex
 
 
 class DataController(Controller):
     """
     Controller class handles not critical data retrieval.
     """
+    def __init__(self, con: Connector, product_index: str = 'product', check_interval: float = 60):
+        """
+        Constructor method takes elastic connector instance and creates cache of breadcrumbs tree.
+        :param con: instance of elastic connector
+        :param product_index: name of index with products, which changes rebuild breadcrumbs tree
+        :param check_interval: minimal count of seconds between checks of product index changes
+        """
+        super().__init__(con)
+        self.breadcrumbs = DocumentCache(con, self.get_breadcrumbs, product_index, check_interval,
+                                         wrap=lambda data: [data])
+        self.breadcrumbs_index = None
+
     def get_indexes_health(self):
         """
         With elastic api return cluster indexes health.
@@ -29,6 +44,45 @@ class DataController(Controller):
         """
         return self.connector.get_data_breadcrumbs()
 
+    def get_breadcrumbs_document(self):
+        """
+        Return pre-serialized full breadcrumbs structure, which is rebuilt only when products change.
+        :return: SerializedDocument, return code
+        """
+        try:
+            return self.breadcrumbs.get()
+
+        except Exception as e:
+            print("[DataController-get_breadcrumbs_document] Error: " + str(e), file=sys.stderr)
+            return {'error': str(e), 'error_code': 500}, 500
+
+    def get_breadcrumbs_children(self, path: list):
+        """
+        Return node of breadcrumbs tree on path from root with its direct children and their children counts.
+        :param path: list of node names from root, empty list is the root
+        :return: dict, return code
+        """
+        try:
+            document, ret_code = self.breadcrumbs.get()
+            if ret_code != 200:
+                return document, ret_code
+
+            # index is rebuilt together with the tree
+            index = self.breadcrumbs_index
+            if not index or index.version != document.etag:
+                index = TreeIndex(document.data[0], document.etag)
+                self.breadcrumbs_index = index
+
+            data = index.children(path or [])
+            if data is None:
+                return {'error': 'Node not found', 'error_code': 404}, 404
+
+            return data, 200
+
+        except Exception as e:
+            print("[DataController-get_breadcrumbs_children] Error: " + str(e), file=sys.stderr)
+            return {'error': str(e), 'error_code': 500}, 500
+
     def get_actualization_statistics(self, category: str):
         """
         Retrieve graph data for review_count, affected_products, new_products, new_product_reviews statistics.
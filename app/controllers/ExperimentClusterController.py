@@ -6,14 +6,28 @@ clusters, topics and sentences.
 Author: xkloco00@stud.fit.vutbr.cz
 """
 
-import sys, time, warnings
+import sys, time, warnings, threading, uuid
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
 from datetime import datetime, timezone
 
+import numpy as np
+from elasticsearch import NotFoundError
+from elasticsearch.helpers import scan, streaming_bulk
+
 from review_analysis.utils.elastic_connector import Connector
 from review_analysis.utils.morpho_tagger import MorphoTagger
 from review_analysis.clasification.fasttext_model import FastTextModel, EmbeddingType, ClusterMethod, EmbeddingModel
 from review_analysis.clasification.LDA_model import LDA_model
+from app.utils.JobQueue import Job, JobQueue
+from app.utils.Exceptions import JobCancelled
+from app.utils.LemmaStore import LemmaStore
+from app.utils.TaggerPool import TaggerPool, tag_sentence
+from app.utils.SentenceEmbedder import SentenceEmbedder
+from app.utils.TTLCache import TTLCache
+from app.utils.VectorClustering import cluster_vectors, centroids, assign_nearest, stratified_sample, \
+    distance_stats, assignment_metric
+from app.config import DOMAIN_INDEXES, SHOP_REVIEW_INDEX
 
 warnings.filterwarnings("ignore", module="matplotlib")
 
@@ -23,35 +37,113 @@ class ExperimentClusterController:
     Controller class handles clustering related task, provides CRUD API for clusters, topics, sentences.
     Handles clustering similarity experiment.
     """
-    def __init__(self, con: Connector):
+    phases = ['reviews', 'tagging', 'clustering', 'saving']
+    update_phases = ['reviews', 'tagging', 'assigning', 'saving']
+
+    def __init__(self, con: Connector, workers: int = 1, max_pending: int = 8, bulk_chunk_size: int = 500,
+                 lemma_store: LemmaStore = None, tagger_workers: int = 1, tagger_chunk_size: int = 256,
+                 embedder: SentenceEmbedder = None, memory_cap: int = 1024 ** 3, max_landmarks: int = 2048,
+                 sample_size: int = 0, salient_cache: TTLCache = None):
         """
         Constructor method takes elastic connector instance, initialise morphological tagger and loads FastText model.
         :param con: instance of elastic connector
+        :param workers: count of clustering experiments executed concurrently in background
+        :param max_pending: maximum count of queued and running clustering experiments
+        :param bulk_chunk_size: count of documents sent to elasticsearch in one bulk request
+        :param lemma_store: persistent store of pos tagged sentences
+        :param tagger_workers: count of processes for pos tagging of reviews
+        :param tagger_chunk_size: count of sentences sent to tagging process at once
+        :param embedder: cached mean word vector sentence embeddings, if None FastText model clusters sentences
+        :param memory_cap: maximum size in bytes of feature matrix of embedder clustering, FastText model clustering
+        only reports exceeding it
+        :param max_landmarks: maximum count of landmark sentences of blockwise embedder clustering
+        :param sample_size: default size of clustered sample of sentences, the rest is assigned to the nearest
+        cluster, 0 clusters all sentences, sampling requires embedder
+        :param salient_cache: cache of category -> set of salient lemmas, which is invalidated by changes of experiments
         """
         self.connector = con
+        tagger_path = '../model/czech-morfflex-pdt-161115-no_dia-pos_only.tagger'
         self.tagger = MorphoTagger()
-        self.tagger.load_tagger(path='../model/czech-morfflex-pdt-161115-no_dia-pos_only.tagger')
+        self.tagger.load_tagger(path=tagger_path)
+        self.tagger_pool = TaggerPool(tagger_path, tagger_workers, tagger_chunk_size)
+        # tagger is shared by request handlers and background jobs
+        self.tagger_lock = threading.Lock()
         self.fastTextModel = FastTextModel()
+        # FastText model is shared by pos and con clustering, which run in parallel, its thread safety is not known
+        self.fasttext_lock = threading.Lock()
+        if sample_size and not embedder:
+            raise ValueError('ExperimentController: sample clustering requires embedder, configure EMBEDDING_CACHE_DIR')
+        self.embedder = embedder
+        self.memory_cap = memory_cap
+        self.max_landmarks = max_landmarks
+        self.sample_size = sample_size
+        self.salient_cache = salient_cache or TTLCache()
+        self.jobs = JobQueue(workers, max_pending)
+        self.bulk_chunk_size = bulk_chunk_size
+        self.lemma_store = lemma_store or LemmaStore('lemma_store.sqlite')
+
+    def __local_tag(self, sentence: str):
+        """
+        Perform pos tagging of sentence with tagger of controller.
+        :param sentence: text of sentence
+        :return: count of sentences, list of lemmas of the first sentence
+        """
+        with self.tagger_lock:
+            return tag_sentence(self.tagger, sentence)
 
-    def __get_sentences(self, rev: dict, sen_type: str):
+    def __tag_reviews(self, reviews: list, job: Job):
+        """
+        Get count of sentences and lemmas of the first sentence for each pros/cons sentence of reviews. Stored
+        sentences are taken from lemma store, the rest is tagged by tagger pool and stored.
+        :param reviews: list of review dictionaries
+        :param job: job for progress reporting and cancellation
+        :return: list of dictionaries pros/cons -> list of (count of sentences, lemmas) for each review
         """
-        Perform pos tagging on sentence list from review rev, specified by type of polarity sen_type.
+        tagged = []
+        missing = []
+        for position, rev in enumerate(reviews):
+            review_tagged = {}
+            for sen_type in ['pros', 'cons']:
+                stored = self.lemma_store.get_review(rev['_id'], sen_type)
+                review_tagged[sen_type] = []
+                for index, sentence in enumerate(rev[sen_type]):
+                    entry = stored.get(index)
+                    if entry and entry[0] == LemmaStore.text_hash(sentence):
+                        review_tagged[sen_type].append((entry[1], entry[2]))
+                    else:
+                        review_tagged[sen_type].append(None)
+                        missing.append((position, sen_type, index, sentence))
+            tagged.append(review_tagged)
+
+        job.set_phase('tagging', len(missing))
+        results = self.tagger_pool.tag([m[3] for m in missing], self.__local_tag, job.advance)
+        for (position, sen_type, index, sentence), (count, lemmas) in zip(missing, results):
+            tagged[position][sen_type][index] = (count, lemmas)
+            self.lemma_store.put(reviews[position]['_id'], sen_type, index, sentence, count, lemmas)
+        self.lemma_store.flush()
+
+        return tagged
+
+    def __get_sentences(self, rev: dict, sen_type: str, tagged: list):
+        """
+        Create sentences dictionaries from tagged sentence list from review rev, specified by type of polarity
+        sen_type.
         :param rev: review dictionary
         :param sen_type: type of sentences of review pros/cons
+        :param tagged: list of (count of sentences, lemmas) for each sentence of review section
         :return: list of sentences dictionary: List[Dict[str, Union[list, int, str]]]
         """
         sentences = []
         for index, sentence in enumerate(rev[sen_type]):
-            sentence_pos = self.tagger.pos_tagging(sentence, False)
-            if not sentence_pos:
+            sentence_count, sentence_list = tagged[index]
+            if not sentence_count:
                 continue
             # multi sentence
-            if len(sentence_pos) > 1:
+            if sentence_count > 1:
                 pass
             else:
                 # two or more words
-                if len(sentence_pos[0]) > 1:
-                    sentence_list = [wb.lemma for wb in sentence_pos[0]]
+                if len(sentence_list) > 1:
                     sentences.append({
                         'review_id': rev['_id'],
                         'sentence': sentence,
@@ -59,7 +151,8 @@ class ExperimentClusterController:
                         'sentence_index': index,
                         'sentence_type': sen_type,
                         'product_name': rev['product_name'],
-                        'category_name': rev['category']
+                        'category_name': rev['category'],
+                        'review_date': str(rev.get('date', '')),
                     })
 
         return sentences
@@ -111,9 +204,10 @@ class ExperimentClusterController:
 
     def __cluster(self, sentences: list, clusters_count: int, topics_per_cluster: int,
                   embedding_type: EmbeddingType, cluster_method: ClusterMethod,
-                  experiment_id: str, embedding_model: EmbeddingModel, sentence_type: str):
+                  experiment_id: str, embedding_model: EmbeddingModel, sentence_type: str, job: Job,
+                  sample_size: int = 0):
         """
-        Perform clustering of sentences with given arguments.
+        Perform clustering of sentences with given arguments, report progress to job.
         :param sentences: list of lemma sentences
         :param clusters_count: count of clusters
         :param topics_per_cluster: count of topics per cluster
@@ -122,6 +216,9 @@ class ExperimentClusterController:
         :param experiment_id: ID of experiment
         :param embedding_model: type of embedding model, from which embedding will be generated
         :param sentence_type: type of sentences pos/con
+        :param job: job of experiment for progress reporting and cancellation
+        :param sample_size: size of stratified sample of sentences clustered by k-means and LDA, the rest is assigned
+        to the nearest cluster and topic, 0 clusters all sentences
         :return: touple of dictionary which represents list of clusters and salient words:
         Tuple[Dict[str, Union[int, list]], list]
         """
@@ -132,17 +229,27 @@ class ExperimentClusterController:
         # assign lemmas of sentence to each sentence
         sentences_pos = [sentence['sentence_pos'] for sentence in sentences]
         # perform clustering
-        labels = self.fastTextModel.cluster_similarity(sentences_pos, embedding_model, embedding=embedding_type,
-                                                       cluster=cluster_method, cluster_cnt=clusters_count)
+        sample = None
+        if sample_size and len(sentences) > max(sample_size, clusters_count):
+            # stratified by product and month of review
+            sample = stratified_sample([(s['product_name'], s['review_date'][:7]) for s in sentences], sample_size)
+            labels, cluster['clustering'], vectors = self.__cluster_sample(sentences_pos, sample, clusters_count,
+                                                                           embedding_type, cluster_method,
+                                                                           embedding_model)
+        else:
+            labels, cluster['clustering'] = self.__cluster_labels(sentences_pos, clusters_count, embedding_type,
+                                                                  cluster_method, embedding_model)
         #import math, random
         #labels = [math.floor(random.uniform(0, 7)) for _ in sentences_pos]
         cnt = Counter(labels)
+        job.advance()
 
-        # init clusters representation with meta data
+        # init clusters representation with meta data, ids are assigned here so that documents can be bulk indexed
         clusters = {}
         label_to_cluster_id = {}
         for key, value in cnt.items():
             cluster_meta = {
+                'cluster_id': uuid.uuid4().hex,
                 'cluster_number': key,
                 'cluster_sentences_count': value,
                 'sentences': [],
@@ -150,30 +257,33 @@ class ExperimentClusterController:
                 'experiment_id': experiment_id,
                 'type': sentence_type
             }
-            cluster_id = self.save_cluster_meta(cluster_meta)
-            if not cluster_id:
-                raise Exception('Cluster not saved')
-
-            cluster_meta['cluster_id'] = cluster_id
             clusters[key] = cluster_meta
-            label_to_cluster_id[key] = cluster_id
+            label_to_cluster_id[key] = cluster_meta['cluster_id']
 
-        # assign experiment data to each sentence
+        # assign experiment data to each sentence, only sampled sentences are passed to LDA
+        in_sample = set(sample.tolist()) if sample is not None else None
         for index, label in enumerate(labels):
             sentences[index]['cluster_number'] = label_to_cluster_id[label]
             sentences[index]['topic_number'] = 0
             sentences[index]['topic_id'] = ''
             sentences[index]['experiment_id'] = experiment_id
-            clusters[label]['sentences'].append(sentences[index])
+            if in_sample is None or index in in_sample:
+                clusters[label]['sentences'].append(sentences[index])
 
         # perform inner cluster information retrieval with LDA, get topics per cluster and salient words
         lda = LDA_model(topics_per_cluster)
-        salient_words = lda.load_sentences_from_api(clusters, self.tagger)
+        with self.tagger_lock:
+            salient_words = lda.load_sentences_from_api(clusters, self.tagger)
+        if sample is not None:
+            self.__assign_topics(clusters, sentences, labels, vectors, in_sample, assignment_metric(embedding_type))
+        job.advance()
 
+        actions = []
         # assign topic information to each sentence
         for _, value in clusters.items():
             topic_to_id = {}
             cluster['clusters'].append(value)
+            actions.append(self.__action('experiment_cluster', value['cluster_id'], self.__cluster_doc(value)))
             if not value['topics']:
                 value['topics'] = ['topic_numb_0']
 
@@ -191,44 +301,215 @@ class ExperimentClusterController:
                     "name": topic,
                     "topic_number": index,
                 }
-                topic_id = self.save_topic(d)
-                if not topic_id:
-                    raise Exception('Did not saved: {}'.format(str(d)))
-                topic_to_id[index] = topic_id
+                topic_to_id[index] = uuid.uuid4().hex
+                actions.append(self.__action('experiment_topic', topic_to_id[index], self.__topic_doc(d)))
 
             # update sentence meta data
             for sentence in value['sentences']:
                 sentence['topic_id'] = topic_to_id[sentence['topic_number']]
-                if not self.save_sentence(sentence):
-                    print('Did not saved: {}'.format(sentence['sentence']), file=sys.stderr)
+                actions.append(self.__action('experiment_sentence', None, self.__sentence_doc(sentence)))
+
+        cluster['failed'] = self.__bulk_index(actions, job)
+        for failed in cluster['failed']:
+            print('Did not saved: {}'.format(str(failed)), file=sys.stderr)
 
-        self.connector.es.indices.refresh(index="experiment_sentence")
-        self.connector.es.indices.refresh(index="experiment_topic")
-        self.connector.es.indices.refresh(index="experiment_cluster")
         return cluster, salient_words
 
-    def __get_reviews_sentences(self, category):
+    def __cluster_labels(self, sentences_pos: list, clusters_count: int, embedding_type: EmbeddingType,
+                         cluster_method: ClusterMethod, embedding_model: EmbeddingModel):
+        """
+        Cluster lemma sentences, sentence vectors are taken from embedding cache if embedder is configured.
+        :param sentences_pos: list of lemma lists
+        :param clusters_count: count of clusters
+        :param embedding_type: type of embedding for sentences (text)
+        :param cluster_method: type of clustering method
+        :param embedding_model: type of embedding model, from which embedding will be generated
+        :return: list of cluster labels, dictionary describing clustering mode
+        """
+        if not self.embedder:
+            info = {'mode': 'fasttext'}
+            if embedding_type != EmbeddingType.sentence_vectors:
+                # FastText model builds dense n x n matrix, blockwise clustering needs embedder
+                info['matrix_bytes'] = len(sentences_pos) ** 2 * 4
+                info['exceeds_memory_cap'] = info['matrix_bytes'] > self.memory_cap
+                if info['exceeds_memory_cap']:
+                    print('ExperimentController-cluster: dense matrix of {} sentences exceeds memory cap, configure '
+                          'EMBEDDING_CACHE_DIR for blockwise clustering'.format(len(sentences_pos)), file=sys.stderr)
+            with self.fasttext_lock:
+                labels = self.fastTextModel.cluster_similarity(sentences_pos, embedding_model,
+                                                               embedding=embedding_type, cluster=cluster_method,
+                                                               cluster_cnt=clusters_count)
+            return labels, info
+
+        vectors = self.embedder.embed(sentences_pos, embedding_model)
+        labels, info = cluster_vectors(vectors, embedding_type, cluster_method, clusters_count,
+                                       memory_cap=self.memory_cap, max_landmarks=self.max_landmarks)
+        info['embedding'] = self.embedder.embedding
+        print('ExperimentController-cluster: {} sentences clustered in {} mode'.format(len(labels), info['mode']),
+              file=sys.stderr)
+        return labels, info
+
+    def __cluster_sample(self, sentences_pos: list, sample, clusters_count: int, embedding_type: EmbeddingType,
+                         cluster_method: ClusterMethod, embedding_model: EmbeddingModel):
+        """
+        Cluster sample of sentences and assign the remaining sentences to the nearest centroid of sample clusters.
+        :param sentences_pos: list of lemma lists
+        :param sample: sorted array of indexes of sampled sentences
+        :param clusters_count: count of clusters
+        :param embedding_type: type of embedding for sentences (text)
+        :param cluster_method: type of clustering method
+        :param embedding_model: type of embedding model, from which embedding will be generated
+        :return: list of cluster labels, dictionary describing clustering, matrix of sentence vectors
+        """
+        vectors = self.embedder.embed(sentences_pos, embedding_model)
+        sample_labels, info = cluster_vectors(vectors[sample], embedding_type, cluster_method, clusters_count,
+                                              memory_cap=self.memory_cap, max_landmarks=self.max_landmarks)
+        # mini-batch k-means may leave clusters empty, centroids are computed only for used labels
+        used, sample_labels = np.unique(sample_labels, return_inverse=True)
+        metric = assignment_metric(embedding_type)
+        nearest, distances = assign_nearest(vectors, centroids(vectors[sample], sample_labels, len(used), metric),
+                                            metric=metric)
+        nearest[sample] = sample_labels
+        rest = np.ones(len(vectors), dtype=bool)
+        rest[sample] = False
+
+        info['embedding'] = self.embedder.embedding
+        info['sample_size'] = len(sample)
+        info['assignment_metric'] = metric
+        info['assignment_distance'] = distance_stats(distances[rest])
+        print('ExperimentController-cluster: {} sampled sentences clustered, {} assigned'.format(
+            len(sample), int(rest.sum())), file=sys.stderr)
+        return used[nearest].tolist(), info, vectors
+
+    @staticmethod
+    def __assign_topics(clusters: dict, sentences: list, labels: list, vectors, in_sample: set, metric: str):
+        """
+        Assign sentences outside of sample to the nearest topic of their cluster, topics are represented by centroids
+        of sampled sentences, which were assigned to them by LDA. Sentences are appended to their clusters.
+        :param clusters: dictionary of label -> cluster with sampled sentences
+        :param sentences: list of all sentences
+        :param labels: cluster label of each sentence
+        :param vectors: matrix of sentence vectors
+        :param in_sample: set of indexes of sampled sentences
+        :param metric: metric of assignment, 'cosine' or 'euclidean'
+        """
+        members = {}
+        for index, label in enumerate(labels):
+            members.setdefault(label, []).append(index)
+
+        for label, indexes in members.items():
+            sampled = [i for i in indexes if i in in_sample]
+            rest = [i for i in indexes if i not in in_sample]
+            if not rest:
+                continue
+            topic_numbers, topic_labels = np.unique([sentences[i]['topic_number'] for i in sampled],
+                                                    return_inverse=True)
+            nearest, _ = assign_nearest(vectors[rest], centroids(vectors[sampled], topic_labels, len(topic_numbers),
+                                                                 metric), metric=metric)
+            for index, topic in zip(rest, nearest):
+                sentences[index]['topic_number'] = int(topic_numbers[topic])
+                clusters[label]['sentences'].append(sentences[index])
+
+    @staticmethod
+    def __action(index: str, doc_id, doc: dict):
+        """
+        Create bulk index action for document.
+        :param index: name of index
+        :param doc_id: ID of document, None lets elasticsearch generate it
+        :param doc: document
+        :return: bulk action dictionary
+        """
+        action = {
+            '_op_type': 'index',
+            '_index': index,
+            '_source': doc,
+        }
+        if doc_id:
+            action['_id'] = doc_id
+        return action
+
+    def __bulk_index(self, actions, job: Job):
+        """
+        Stream actions to elasticsearch in chunks, indices are not refreshed.
+        :param actions: iterable of bulk actions
+        :param job: job for progress reporting and cancellation, advanced by each indexed sentence
+        :return: list of failed documents with error
+        """
+        failed = []
+        for ok, item in streaming_bulk(self.connector.es, actions, chunk_size=self.bulk_chunk_size,
+                                       raise_on_error=False, raise_on_exception=False):
+            result = item.get('index', {})
+            if not ok:
+                failed.append({
+                    'index': result.get('_index'),
+                    '_id': result.get('_id'),
+                    'error': str(result.get('error')),
+                })
+            if result.get('_index') == 'experiment_sentence':
+                job.advance()
+
+        return failed
+
+    def __refresh(self):
+        """
+        Refresh experiment indexes, so that newly indexed documents are searchable.
+        """
+        self.connector.es.indices.refresh(index="experiment_sentence,experiment_topic,experiment_cluster")
+
+    def __get_reviews_sentences(self, category, job: Job = None, since: str = None):
         """
         Get positive and negative sentences from domain category or product/shop.
         :param category: name of product/shop/category
+        :param job: job for progress reporting and cancellation
+        :param since: date YYYY-MM-DD, only reviews from this date are loaded
         :return: touple of sentences: Tuple[list, list]
         """
+        job = job or Job()
         sentences_pro = []
         sentences_con = []
 
-        reviews, ret = self.connector.get_reviews_from_category(category)
+        job.set_phase('reviews')
+        if since:
+            reviews = self.__get_reviews_since(category, since)
+        else:
+            reviews, ret = self.connector.get_reviews_from_category(category)
 
-        # check if it is not product
-        if ret == 404:
-            reviews, ret = self.connector.get_reviews_from_product(category)
+            # check if it is not product
+            if ret == 404:
+                reviews, ret = self.connector.get_reviews_from_product(category)
 
         # create sentences pos cons
-        for review in reviews:
-            sentences_pro += self.__get_sentences(review, 'pros')
-            sentences_con += self.__get_sentences(review, 'cons')
+        tagged = self.__tag_reviews(reviews, job)
+        for review, review_tagged in zip(reviews, tagged):
+            sentences_pro += self.__get_sentences(review, 'pros', review_tagged['pros'])
+            sentences_con += self.__get_sentences(review, 'cons', review_tagged['cons'])
 
         return sentences_pro, sentences_con
 
+    def __get_reviews_since(self, category: str, since: str):
+        """
+        Get reviews of category, product or shop from date, date is filtered by elasticsearch.
+        :param category: name of product/shop/category
+        :param since: date YYYY-MM-DD
+        :return: list of review dictionaries with _id
+        """
+        query = {
+            'query': {
+                'bool': {
+                    'filter': [{'range': {'date': {'gte': since}}}],
+                    'should': [
+                        {'term': {'category': category}},
+                        {'term': {'product_name': category}},
+                        {'term': {'shop_name': category}},
+                    ],
+                    'minimum_should_match': 1,
+                }
+            }
+        }
+        indexes = ','.join(DOMAIN_INDEXES + [SHOP_REVIEW_INDEX])
+        return [dict(hit['_source'], _id=hit['_id'])
+                for hit in scan(self.connector.es, index=indexes, query=query, ignore_unavailable=True)]
+
     def save_experiment(self, config: dict):
         """
         Index experiment into elasticsearch.
@@ -256,7 +537,19 @@ class ExperimentClusterController:
         :param sentence: sentence as dict
         :return: id of sentence: Optional[Any]
         """
-        experiment_sentence = {
+        res = self.connector.index(index='experiment_sentence', doc=self.__sentence_doc(sentence))
+        if res['result'] == 'created':
+            return True
+        return False
+
+    @staticmethod
+    def __sentence_doc(sentence: dict):
+        """
+        Create experiment sentence document.
+        :param sentence: sentence as dict
+        :return: document dict
+        """
+        return {
             "review_id": sentence['review_id'],
             "experiment_id": sentence['experiment_id'],
             "topic_number": sentence['topic_number'],
@@ -269,10 +562,6 @@ class ExperimentClusterController:
             "sentence_pos": sentence['sentence_pos'],
             "sentence_type": sentence['sentence_type'],
         }
-        res = self.connector.index(index='experiment_sentence', doc=experiment_sentence)
-        if res['result'] == 'created':
-            return True
-        return False
 
     def save_topic(self, topic_d: dict):
         """
@@ -280,16 +569,24 @@ class ExperimentClusterController:
         :param topic_d: topic as dict
         :return: id of topic: Optional[Any]
         """
-        experiment_topic = {
+        res = self.connector.index(index='experiment_topic', doc=self.__topic_doc(topic_d))
+        if res['result'] == 'created':
+            return res['_id']
+        return None
+
+    @staticmethod
+    def __topic_doc(topic_d: dict):
+        """
+        Create experiment topic document.
+        :param topic_d: topic as dict
+        :return: document dict
+        """
+        return {
             "experiment_id": topic_d['experiment_id'],
             "cluster_number": topic_d['cluster_number'],
             "name": topic_d['name'],
             "topic_number": topic_d["topic_number"],
         }
-        res = self.connector.index(index='experiment_topic', doc=experiment_topic)
-        if res['result'] == 'created':
-            return res['_id']
-        return None
 
     def save_cluster_meta(self, cluster_d: dict):
         """
@@ -297,19 +594,27 @@ class ExperimentClusterController:
         :param cluster_d: cluster as dict
         :return: id of cluster: Optional[Any]
         """
-        cluster = {
+        res = self.connector.index(index='experiment_cluster', doc=self.__cluster_doc(cluster_d))
+
+        if res['result'] == 'created':
+            return res['_id']
+        return None
+
+    @staticmethod
+    def __cluster_doc(cluster_d: dict):
+        """
+        Create experiment cluster document.
+        :param cluster_d: cluster as dict
+        :return: document dict
+        """
+        return {
             'experiment_id': cluster_d['experiment_id'],
             'type': cluster_d['type'],
             'cluster_name': 'cluster_' + str(cluster_d['cluster_number']),
             'cluster_number': cluster_d['cluster_number'],
+            'cluster_sentences_count': cluster_d.get('cluster_sentences_count', 0),
         }
 
-        res = self.connector.index(index='experiment_cluster', doc=cluster)
-
-        if res['result'] == 'created':
-            return res['_id']
-        return None
-
     def get_experiment(self):
         """
         Get All experiments.
@@ -385,6 +690,8 @@ class ExperimentClusterController:
         """
         try:
             data, ret_code = self.connector.delete_experiment(content['experiment_id'])
+            # category of experiment is not known here
+            self.salient_cache.clear()
 
             if ret_code == 200:
                 data, ret_code = self.connector.get_experiments()
@@ -476,60 +783,343 @@ class ExperimentClusterController:
             print('ExperimentController-peek_sentences: {}'.format(str(e)), file=sys.stderr)
             return {'error': str(e), 'error_code': 500}, 500
 
-    def cluster_similarity(self, config: dict):
+    def __get_experiment_config(self, config: dict):
+        """
+        Validate clustering configuration and convert its string values to enums.
+        :param config:
+        :return: touple of embedding type, cluster method and embedding model
+        """
+        embedding_type = self.__get_embedding_type(config)
+        cluster_method = self.__get_cluster_method(config)
+        embedding_model = self.__get_embedding_model(config)
+        if self.embedder and not self.embedder.supports(embedding_model):
+            raise KeyError('No word vectors configured for embedding model {}'.format(embedding_model.name))
+        if config.get('sample_size') and not self.embedder:
+            raise KeyError('sample_size requires embedding cache')
+
+        if not config['category']:
+            # raise WrongProperty('Empty category')
+            raise KeyError('category not found')
+
+        d_existing, r_c = self.connector.get_experiments_by_category(config['category'])
+        if d_existing or r_c == 200:
+            raise KeyError('Experiment already exists')
+
+        return embedding_type, cluster_method, embedding_model
+
+    def start_cluster_similarity(self, config: dict):
+        """
+        Validate configuration and enqueue clustering experiment as background job.
+        :param config:
+        :return: job state dictionary, return code
+        """
+        try:
+            self.__get_experiment_config(config)
+            job = self.jobs.submit(self.__cluster_similarity_job, config, phases=self.phases)
+
+            return job.to_dict(), 202
+
+        except KeyError as e:
+            print('ExperimentController-start_cluster_similarity: {}'.format(str(e)), file=sys.stderr)
+            return {'error': str(e), 'error_code': 400}, 400
+
+        except OverflowError as e:
+            print('ExperimentController-start_cluster_similarity: {}'.format(str(e)), file=sys.stderr)
+            return {'error': str(e), 'error_code': 503}, 503
+
+        except Exception as e:
+            print('ExperimentController-start_cluster_similarity: {}'.format(str(e)), file=sys.stderr)
+            return {'error': str(e), 'error_code': 500}, 500
+
+    def __cluster_similarity_job(self, config: dict, job: Job):
+        """
+        Run clustering experiment within job, result of job is summary of experiment, clusters are in elasticsearch.
+        :param config:
+        :param job:
+        :return: summary dictionary
+        """
+        data, ret_code = self.cluster_similarity(config, job)
+        if ret_code != 200:
+            raise Exception(data['error'])
+
+        return {
+            'experiment_id': data['experiment_id'],
+            'pos': {'sentences_count': data['pos']['sentences_count'], 'clusters_count': len(data['pos']['clusters']),
+                    'clustering': data['pos']['clustering']},
+            'con': {'sentences_count': data['con']['sentences_count'], 'clusters_count': len(data['con']['clusters']),
+                    'clustering': data['con']['clustering']},
+        }
+
+    def get_job(self, job_id: str):
+        """
+        Get state of background clustering job.
+        :param job_id:
+        :return: job state dictionary, return code
+        """
+        job = self.jobs.get(job_id)
+        if not job:
+            return {'error': 'Job not found', 'error_code': 404}, 404
+        return job.to_dict(), 200
+
+    def cancel_job(self, job_id: str):
+        """
+        Cancel background clustering job, partially saved experiment is removed.
+        :param job_id:
+        :return: job state dictionary, return code
+        """
+        job = self.jobs.cancel(job_id)
+        if not job:
+            return {'error': 'Job not found', 'error_code': 404}, 404
+        return job.to_dict(), 200
+
+    def cluster_similarity(self, config: dict, job: Job = None):
         """
         Perform text clustering according to configuration in config dictionary.
         :param config:
+        :param job: job for progress reporting and cancellation
         :return: clustering data dictionary, return code
         """
         start = time.time()
+        job = job or Job()
         data = {}
+        experiment_id = None
         try:
-            embedding_type = self.__get_embedding_type(config)
-            cluster_method = self.__get_cluster_method(config)
-            embedding_model = self.__get_embedding_model(config)
-
-            if not config['category']:
-                # raise WrongProperty('Empty category')
-                raise KeyError('category not found')
-
-            d_existing, r_c = self.connector.get_experiments_by_category(config['category'])
-            if d_existing or r_c == 200:
-                raise KeyError('Experiment already exists')
+            embedding_type, cluster_method, embedding_model = self.__get_experiment_config(config)
+            sample_size = int(config.get('sample_size') or self.sample_size)
 
             # create sentences pos cons
-            sentences_pro, sentences_con = self.__get_reviews_sentences(config['category'])
+            sentences_pro, sentences_con = self.__get_reviews_sentences(config['category'], job)
 
             experiment_id = self.save_experiment(config)
             if not experiment_id:
                 raise Exception('Experiment was not saved')
-
-            data['pos'], salient_pos = self.__cluster(sentences_pro, config['clusters_pos_count'],
-                                                      config['topics_per_cluster'], embedding_type,
-                                                      cluster_method, experiment_id, embedding_model,
-                                                      'pos')
-            data['con'], salient_con = self.__cluster(sentences_con, config['clusters_con_count'],
-                                                      config['topics_per_cluster'], embedding_type,
-                                                      cluster_method, experiment_id, embedding_model,
-                                                      'con')
-
+            data['experiment_id'] = experiment_id
+
+            # pos and con sentences are clustered independently in parallel, FastText model is used by one at a time
+            job.set_phase('clustering', len(sentences_pro) + len(sentences_con) + 4)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                future_pos = executor.submit(self.__cluster, sentences_pro, config['clusters_pos_count'],
+                                             config['topics_per_cluster'], embedding_type,
+                                             cluster_method, experiment_id, embedding_model,
+                                             'pos', job, sample_size)
+                future_con = executor.submit(self.__cluster, sentences_con, config['clusters_con_count'],
+                                             config['topics_per_cluster'], embedding_type,
+                                             cluster_method, experiment_id, embedding_model,
+                                             'con', job, sample_size)
+                # failure of one side cancels job, so that the other side stops at its next check instead of
+                # indexing sentences of experiment, which will be removed
+                done, _ = wait([future_pos, future_con], return_when=FIRST_EXCEPTION)
+                if any(f.exception() for f in done):
+                    job.cancel()
+                # wait for both sides, so that cleanup is not racing with indexing
+                errors = [f.exception() for f in [future_pos, future_con] if f.exception()]
+            if errors:
+                # cancellation of sibling is reported only if there is no other error
+                errors.sort(key=lambda e: isinstance(e, JobCancelled))
+                raise errors[0]
+            data['pos'], salient_pos = future_pos.result()
+            data['con'], salient_con = future_con.result()
+
+            job.set_phase('saving')
+            self.__refresh()
             res, ret_code = self.connector.update_experiment(
                 experiment_id, salient_pos, salient_con,
             )
             if res['result'] != 'updated':
                 raise Exception('Update of salient words failed')
+            self.salient_cache.invalidate(config['category'])
 
             print(time.time() - start)
             return data, ret_code
 
+        except JobCancelled:
+            self.__remove_experiment(experiment_id)
+            raise
+
         except KeyError as e:
             print('ExperimentController-cluster_similarity: {}'.format(str(e)), file=sys.stderr)
+            self.__remove_experiment(experiment_id)
             return {'error': str(e), 'error_code': 400}, 400
 
         except Exception as e:
             print('ExperimentController-cluster_similarity: {}'.format(str(e)), file=sys.stderr)
+            self.__remove_experiment(experiment_id)
+            return {'error': str(e), 'error_code': 500}, 500
+
+    def __remove_experiment(self, experiment_id):
+        """
+        Remove partially saved experiment with its clusters, topics and sentences.
+        :param experiment_id: ID of experiment or None if it was not saved yet
+        """
+        if not experiment_id:
+            return
+        try:
+            # make already indexed documents visible for deletion
+            self.__refresh()
+            self.connector.delete_experiment(experiment_id)
+            self.salient_cache.clear()
+        except Exception as e:
+            print('ExperimentController-remove_experiment: {}'.format(str(e)), file=sys.stderr)
+
+    def start_update_experiment(self, config: dict):
+        """
+        Validate experiment and enqueue its incremental update as background job.
+        :param config: dictionary with experiment_id
+        :return: job state dictionary, return code
+        """
+        try:
+            if not self.embedder:
+                raise KeyError('Incremental update requires embedding cache')
+            try:
+                self.connector.es.get(index='experiment', id=config['experiment_id'])
+            except NotFoundError:
+                return {'error': 'Experiment not found', 'error_code': 404}, 404
+            job = self.jobs.submit(self.update_experiment, config, phases=self.update_phases)
+
+            return job.to_dict(), 202
+
+        except KeyError as e:
+            print('ExperimentController-start_update_experiment: {}'.format(str(e)), file=sys.stderr)
+            return {'error': str(e), 'error_code': 400}, 400
+
+        except OverflowError as e:
+            print('ExperimentController-start_update_experiment: {}'.format(str(e)), file=sys.stderr)
+            return {'error': str(e), 'error_code': 503}, 503
+
+        except Exception as e:
+            print('ExperimentController-start_update_experiment: {}'.format(str(e)), file=sys.stderr)
             return {'error': str(e), 'error_code': 500}, 500
 
+    def update_experiment(self, config: dict, job: Job):
+        """
+        Assign sentences of reviews crawled after the last update of experiment to the nearest existing cluster and
+        topic. Clusters and topics are taken from current sentences of experiment, so manual changes are kept. Sentence
+        counts of experiment and its clusters are updated. Sentences are compared by their vectors, so update requires
+        embedder.
+        :param config: dictionary with experiment_id
+        :param job: job for progress reporting and cancellation
+        :return: summary dictionary with count of added sentences
+        """
+        experiment_id = config['experiment_id']
+        experiment = self.connector.es.get(index='experiment', id=experiment_id)['_source']
+        embedding_model = self.__get_embedding_model(experiment)
+        embedding_type = self.__get_embedding_type(experiment)
+        since = experiment.get('updated', experiment['date'])
+        updated = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+        sentences_pro, sentences_con = self.__get_reviews_sentences(experiment['category'], job, since[:10])
+
+        job.set_phase('assigning')
+        existing = self.__get_stored_sentences(experiment_id)
+        known = set((s['review_id'], s['sentence_type'], s['sentence_index']) for s in existing)
+        data = {'experiment_id': experiment_id}
+        actions = []
+        for sentence_type, sentences in [('pos', sentences_pro), ('con', sentences_con)]:
+            sen_type = 'pros' if sentence_type == 'pos' else 'cons'
+            new = [s for s in sentences if (s['review_id'], s['sentence_type'], s['sentence_index']) not in known]
+            data[sentence_type] = self.__assign_sentences(
+                new, [s for s in existing if s['sentence_type'] == sen_type], embedding_model, embedding_type,
+                experiment_id)
+            actions += [self.__action('experiment_sentence', None, self.__sentence_doc(s))
+                        for s in new if 'cluster_number' in s]
+
+        job.set_phase('saving', len(actions))
+        data['failed'] = self.__bulk_index(actions, job)
+        self.__refresh()
+        self.__update_counts(experiment_id, updated)
+
+        return data
+
+    def __update_counts(self, experiment_id: str, updated: str):
+        """
+        Store counts of indexed sentences of experiment into experiment and its cluster documents, counts are taken from
+        index, so that sentences, which failed to be indexed, are not counted.
+        :param experiment_id: ID of experiment
+        :param updated: date of update
+        """
+        query = {'query': {'match_phrase': {'experiment_id': experiment_id}}, '_source': ['cluster_number',
+                                                                                         'sentence_type']}
+        sentences = Counter()
+        clusters = Counter()
+        for hit in scan(self.connector.es, index='experiment_sentence', query=query):
+            sentences[hit['_source']['sentence_type']] += 1
+            clusters[hit['_source']['cluster_number']] += 1
+
+        actions = [{'_op_type': 'update', '_index': 'experiment_cluster', '_id': cluster_id,
+                    'doc': {'cluster_sentences_count': count}} for cluster_id, count in clusters.items()]
+        for ok, item in streaming_bulk(self.connector.es, actions, chunk_size=self.bulk_chunk_size,
+                                       raise_on_error=False, raise_on_exception=False):
+            if not ok:
+                print('ExperimentController-update_counts: {}'.format(str(item)), file=sys.stderr)
+
+        self.connector.es.update(index='experiment', id=experiment_id, body={'doc': {
+            'updated': updated,
+            'pos_sentences': sentences['pros'],
+            'con_sentences': sentences['cons'],
+        }})
+
+    def __get_stored_sentences(self, experiment_id: str):
+        """
+        Get sentences of experiment with their current cluster and topic.
+        :param experiment_id: ID of experiment
+        :return: list of sentence documents
+        """
+        query = {'query': {'match_phrase': {'experiment_id': experiment_id}}}
+        return [hit['_source'] for hit in scan(self.connector.es, index='experiment_sentence', query=query)]
+
+    def __assign_sentences(self, sentences: list, existing: list, embedding_model: EmbeddingModel,
+                           embedding_type: EmbeddingType, experiment_id: str):
+        """
+        Assign sentences to cluster with the nearest centroid of existing sentences and then to the nearest topic of
+        this cluster, sentence dictionaries are updated in place.
+        :param sentences: list of new sentence dictionaries
+        :param existing: list of stored sentence documents of the same type
+        :param embedding_model: embedding model of experiment
+        :param embedding_type: embedding type of experiment, it determines metric of assignment: euclidean for
+        sentence vectors (k-means space), cosine for distance/similarity matrices
+        :param experiment_id: ID of experiment
+        :return: dictionary with count of added sentences, counts per cluster and distances to cluster centroids
+        """
+        if not sentences or not existing:
+            return {'sentences_count': 0, 'clusters': {}, 'distance': {}}
+
+        vectors = self.embedder.embed([s['sentence_pos'] for s in existing], embedding_model)
+        new_vectors = self.embedder.embed([s['sentence_pos'] for s in sentences], embedding_model)
+
+        cluster_ids = sorted(set(s['cluster_number'] for s in existing))
+        cluster_index = {cluster_id: i for i, cluster_id in enumerate(cluster_ids)}
+        cluster_labels = np.array([cluster_index[s['cluster_number']] for s in existing])
+        metric = assignment_metric(embedding_type)
+        nearest, distances = assign_nearest(new_vectors, centroids(vectors, cluster_labels, len(cluster_ids), metric),
+                                            metric=metric)
+
+        topics = sorted(set((s['cluster_number'], s['topic_number'], s['topic_id']) for s in existing))
+        topic_index = {topic: i for i, topic in enumerate(topics)}
+        topic_labels = np.array([topic_index[(s['cluster_number'], s['topic_number'], s['topic_id'])]
+                                 for s in existing])
+        topic_centroids = centroids(vectors, topic_labels, len(topics), metric)
+
+        for i, cluster_id in enumerate(cluster_ids):
+            members = np.flatnonzero(nearest == i)
+            if not len(members):
+                continue
+            cluster_topics = [j for j, topic in enumerate(topics) if topic[0] == cluster_id]
+            nearest_topic, _ = assign_nearest(new_vectors[members], topic_centroids[cluster_topics], metric=metric)
+            for member, topic in zip(members, nearest_topic):
+                _, topic_number, topic_id = topics[cluster_topics[topic]]
+                sentences[member].update({
+                    'cluster_number': cluster_id,
+                    'topic_number': topic_number,
+                    'topic_id': topic_id,
+                    'experiment_id': experiment_id,
+                })
+
+        return {
+            'sentences_count': len(sentences),
+            'clusters': dict(Counter(cluster_ids[i] for i in nearest)),
+            'distance': distance_stats(distances),
+        }
+
     def cluster_merge(self, config: dict):
         """
         Merge experiment cluster with its topics and sentences to another cluster.
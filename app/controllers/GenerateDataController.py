@@ -4,12 +4,13 @@ provides API for dataset exporting with selectable formats.
 
 Author: xkloco00@stud.fit.vutbr.cz
 """
-import zipfile
-import io
 import sys
+import tempfile
 
 from review_analysis.utils.elastic_connector import Connector
 from review_analysis.utils.generate_dataset import GeneratorController
+from app.utils.ZipStream import stream_zip, get_compression
+from app.utils.Exceptions import WrongProperty
 
 
 class GenerateDataController:
@@ -24,28 +25,72 @@ class GenerateDataController:
         self.connector = con
         self.generator = GeneratorController(con)
 
+    @staticmethod
+    def __files(data: dict):
+        """
+        Yield generated files one by one and release each of them once it is written to archive.
+        :param data: dictionary of file name -> list of rows
+        :return: generator of (file name, rows)
+        """
+        for key in list(data.keys()):
+            yield key, data.pop(key)
+
+    def __category_files(self, content: dict, generated: list, chunk_size: int = 64 * 1024):
+        """
+        Generate dataset category by category, so that rows of only one category are held in memory. Rows of each
+        category are appended to temporary file of their output file and released, files are then read in chunks
+        while archive is streamed. Generator runs lazily, when the first chunk of archive is requested.
+        :param content: generating task with more categories
+        :param generated: one item list with already generated data of the first category, it is released after use
+        :param chunk_size: count of characters read from temporary file at once
+        :return: generator of (file name, iterable of text chunks)
+        """
+        spooled = {}
+        try:
+            for index, category in enumerate(content['categories']):
+                data = generated.pop() if not index else self.generator.generate(dict(content, categories=[category]))
+                if 'error' in data:
+                    raise WrongProperty(str(data['error']))
+                for key in list(data.keys()):
+                    if key not in spooled:
+                        spooled[key] = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+                    spooled[key].writelines(data.pop(key))
+                del data
+
+            for key, f in spooled.items():
+                f.seek(0)
+                yield key, iter(lambda f=f: f.read(chunk_size), '')
+        finally:
+            for f in spooled.values():
+                f.close()
+
     def generate_dataset(self, content: dict):
         """
         Export data according to content dictionary values.
         :param content:
-        :return:
+        :return: generator of zip archive chunks, return code
         """
         try:
-            # perform generating task
-            data = self.generator.generate(content)
+            compression = content.get('compression') or 'deflate'
+            get_compression(compression)
+
+            # perform generating task, more categories are generated one by one while archive is streamed
+            categories = content.get('categories') or []
+            first = dict(content, categories=categories[:1]) if len(categories) > 1 else content
+            data = self.generator.generate(first)
 
             # if it is an error return concrete err
             if 'error' in data:
                 return data, 400
+            elif len(categories) > 1:
+                return stream_zip(self.__category_files(content, [data]), compression), 200
             else:
-                # else return zip file
-                data_file = io.BytesIO()
-                with zipfile.ZipFile(data_file, mode='w') as z:
-                    for key, value in data.items():
-                        z.writestr(key, ''.join(value))
-                data_file.seek(0)
-
-                return data_file, 200
+                # else return zip file streamed in chunks
+                return stream_zip(self.__files(data), compression), 200
+
+        except WrongProperty as e:
+            print('GenerateDataController-generate_dataset: {}'.format(str(e)), file=sys.stderr)
+            return {'error': str(e)}, 400
 
         except Exception as e:
             print('GenerateDataController-generate_dataset: {}'.format(str(e)),file=sys.stderr)
@@ -4,10 +4,16 @@ provides API for dataset exporting with selectable formats.
 
 Author: xkloco00@stud.fit.vutbr.cz
 """
-from urllib.request import urlopen
-from bs4 import BeautifulSoup
 import sys
+import json
+from review_analysis.utils.elastic_connector import Connector
 from .Controller import Controller
+from app.utils.DocumentCache import DocumentCache
+from app.utils.ImageFetcher import ImageFetcher
+from app.utils.StatisticsEngine import StatisticsEngine, python_statistics
+from app.utils.ReviewSearch import ReviewSearch, decorate_review
+from app.utils.Exceptions import WrongProperty
+from app.config import DOMAIN_INDEXES, SHOP_REVIEW_INDEX
 
 
 class ProductController(Controller):
@@ -15,6 +21,21 @@ class ProductController(Controller):
     Controller handles product/shop specific tasks and  exporting reviews from elastic, retrieving metadata of products
     like its image on heureka page and simple statistics.
     """
+    def __init__(self, con: Connector, product_index: str = 'product', check_interval: float = 60,
+                 image_fetcher: ImageFetcher = None):
+        """
+        Constructor method takes elastic connector instance and creates cache of breadcrumbs tree.
+        :param con: instance of elastic connector
+        :param product_index: name of index with products, which changes rebuild breadcrumbs tree
+        :param check_interval: minimal count of seconds between checks of product index changes
+        :param image_fetcher: resolver of products image urls with persistent cache
+        """
+        super().__init__(con)
+        self.image_fetcher = image_fetcher or ImageFetcher('image_cache.sqlite')
+        self.review_search = ReviewSearch(con, DOMAIN_INDEXES, SHOP_REVIEW_INDEX)
+        self.statistics_engine = StatisticsEngine(self.review_search)
+        self.breadcrumbs = DocumentCache(con, self.get_breadcrumbs, product_index, check_interval,
+                                         wrap=lambda data: [data])
 
     def get_breadcrumbs(self):
         """
@@ -23,6 +44,18 @@ class ProductController(Controller):
         """
         return self.connector.get_product_breadcrums()
 
+    def get_breadcrumbs_document(self):
+        """
+        Get pre-serialized simplified breadcrumbs tree, which is rebuilt only when products change.
+        :return: SerializedDocument, return code
+        """
+        try:
+            return self.breadcrumbs.get()
+
+        except Exception as e:
+            print('ExperimentController-get_breadcrumbs_document: {}'.format(str(e)), file=sys.stderr)
+            return {'error': str(e), 'error_code': 500}, 500
+
     def get_category_products(self, name: str):
         """
         Get products of category or shops defined by name parameter.
@@ -49,14 +82,7 @@ class ProductController(Controller):
 
             # check analysed reviews
             for review in reviews:
-                # compute rating diff
-                if 'rating_model' in review:
-                    review['rating_diff'] = int(review['rating'][:-1]) - int(review['rating_model'][:-1])
-                else:
-                    review['rating_diff'] = 0
-                # add filter model metadata
-                if 'filter_model' not in review:
-                    review['filter_model'] = False
+                decorate_review(review)
 
             return reviews, code
 
@@ -64,6 +90,53 @@ class ProductController(Controller):
             print('ExperimentController-get_product_reviews: {}'.format(str(e)), file=sys.stderr)
             return {'error': str(e), 'error_code': 500}, 500
 
+    def __page_args(self, content: dict):
+        """
+        Get pagination arguments from content dictionary.
+        :param content:
+        :return: dict of arguments of ReviewSearch.page
+        """
+        return {
+            'size': content.get('size') or 50,
+            'sort': content.get('sort') or 'date',
+            'order': content.get('order') or 'desc',
+            'after': content.get('after'),
+            'fields': content.get('fields'),
+        }
+
+    def get_product_reviews_page(self, content: dict):
+        """
+        Get one page of reviews from shop or product specified by content dictionary.
+        :param content: name, domain and optional size, sort, order, after (cursor) and fields
+        :return: dict with list of reviews and cursor of next page, return code
+        """
+        try:
+            return self.review_search.page(content['name'], content['domain'], **self.__page_args(content)), 200
+
+        except WrongProperty as e:
+            print('ExperimentController-get_product_reviews_page: {}'.format(str(e)), file=sys.stderr)
+            return {'error': str(e), 'error_code': 400}, 400
+
+        except Exception as e:
+            print('ExperimentController-get_product_reviews_page: {}'.format(str(e)), file=sys.stderr)
+            return {'error': str(e), 'error_code': 500}, 500
+
+    def stream_product_reviews(self, content: dict):
+        """
+        Stream reviews from shop or product as newline delimited json, reviews are loaded page by page.
+        :param content: name, domain and optional size, sort, order, after (cursor) and fields
+        :return: generator of ndjson lines
+        """
+        args = self.__page_args(content)
+        args['size'] = content.get('size') or 500
+        try:
+            for review in self.review_search.pages(content['name'], content['domain'], **args):
+                yield json.dumps(review, ensure_ascii=False) + '\n'
+
+        except Exception as e:
+            print('ExperimentController-stream_product_reviews: {}'.format(str(e)), file=sys.stderr)
+            yield json.dumps({'error': str(e), 'error_code': 500}) + '\n'
+
     def get_product_image_url(self, product_url: str):
         """
         Get products image url from products url on heureka site.
@@ -73,8 +146,9 @@ class ProductController(Controller):
         data = {}
         ret_code = 200
         try:
-            xml = BeautifulSoup(urlopen(product_url), 'lxml')
-            src = xml.find('td').find('img').get('src')
+            src = self.image_fetcher.get(product_url)
+            if not src:
+                raise AttributeError('Image of {} not found'.format(product_url))
 
             data['src'] = src
 
@@ -87,15 +161,41 @@ class ProductController(Controller):
         finally:
             return data, ret_code
 
+    def get_product_image_urls(self, product_urls: list, max_urls: int = 200):
+        """
+        Get image urls of list of products, pages are downloaded concurrently.
+        :param product_urls: list of products urls
+        :param max_urls: maximum count of urls in one request
+        :return: dict of product url -> image url or None, return code
+        """
+        try:
+            if len(product_urls) > max_urls:
+                return {'error': 'Too many urls, maximum is {}'.format(max_urls), 'error_code': 400}, 400
+
+            return {'images': self.image_fetcher.get_many(product_urls)}, 200
+
+        except Exception as e:
+            print('ExperimentController-get_product_image_urls: {}'.format(str(e)), file=sys.stderr)
+            return {'error': str(e), 'error_code': 500}, 500
+
     def get_statistics(self, content: dict):
         """
-        Compute products/shop statistics as AVG rating/recommends, review count graph in time
+        Compute products/shop statistics as AVG rating/recommends, review count graph in time. Statistics are
+        computed by elasticsearch aggregations, reviews are loaded and processed in python only if it fails.
         :param content:
         :return: dict of statistics, return code
         """
         try:
-            data = {}
             ret_code = 200
+            try:
+                data = self.statistics_engine.statistics(content['name'], content['domain'])
+            except Exception as e:
+                print('ExperimentController-get_statistics: {}'.format(str(e)), file=sys.stderr)
+                data = None
+
+            if data:
+                return data, ret_code
+
             if content['domain'] == 'shop':
                 reviews, _ = self.connector.get_reviews_from_shop(content['name'])
             else:
@@ -104,39 +204,7 @@ class ProductController(Controller):
             if not reviews:
                 raise Exception('Item {} does not have any reviews'.format(content['name']))
 
-            sum_rating = 0
-            sum_recommends = 0
-            dates_d = {}
-            for review in reviews:
-                try:
-                    sum_rating += int(review['rating'][:-1])
-                    date_str = '-'.join(review['date'].split('-')[:2])+'-01'
-
-                    if date_str not in dates_d:
-                        dates_d[date_str] = {
-                               'month': ' '.join(review['date_str'].split()[1:]),
-                                'cnt': 0
-                        }
-                    dates_d[date_str]['cnt'] += 1
-                    if review['recommends'] == 'YES':
-                        sum_recommends += 1
-
-                except Exception as e:
-                    # some reviews has empty ratings...
-                    pass
-
-            avg_rating = sum_rating / len(reviews)
-            avg_recommends = sum_recommends / len(reviews)
-
-            review_dates = []
-            for key, value in sorted( dates_d.items() ):
-                review_dates.append([value['month'], value['cnt']])
-
-            data['avg_rating'] = '{:.2f}%'.format(avg_rating)
-            data['avg_recommends'] = '{:.2f}%'.format(avg_recommends*100)
-            data['review_dates'] = review_dates
-
-            return data, ret_code
+            return python_statistics(reviews), ret_code
 
         except Exception as e:
             print('ExperimentController-get_experiment_sentences: {}'.format(str(e)), file=sys.stderr)
@@ -9,7 +9,7 @@ This class uses trained models to perform analysis right on the requests.
 Author: xkloco00@stud.fit.vutbr.cz
 """
 from review_analysis.utils.elastic_connector import Connector
-import warnings, sys, re
+import warnings, sys, re, threading, time
 from nltk.tokenize import sent_tokenize
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -17,6 +17,14 @@ warnings.simplefilter(action='ignore', category=FutureWarning)
 from review_analysis.clasification.bert_model import Bert_model
 from review_analysis.clasification.SVM_model import SVM_Classifier
 from review_analysis.utils.morpho_tagger import MorphoTagger
+from app.utils.BatchEvaluator import eval_sentences
+from app.utils.ModelRegistry import ModelRegistry
+from app.utils.TTLCache import TTLCache
+from app.utils.InferenceCache import InferenceCache, model_version
+from app.utils.ReviewWriter import ReviewWriter
+from app.utils.InferenceScheduler import InferenceScheduler
+from app.utils.Quantization import quantize_model, module_size
+from app.config import DOMAIN_INDEXES
 
 
 class ReviewController:
@@ -26,14 +34,36 @@ class ReviewController:
     review analysis and text rating.
     """
 
-    def __init__(self, con: Connector):
+    def __init__(self, con: Connector, batch_size: int = 32, memory_budget: int = 0, path: str = '../model/',
+                 salient_cache: TTLCache = None, inference_cache: InferenceCache = None,
+                 review_writer: ReviewWriter = None, scheduler_config: dict = None, quantized: list = None):
         """
-        Constructor method takes elastic connector instance. Initializes morphological tagger and domain bipolar bert
-        models, text rating prediction model, irrelevant model.
+        Constructor method takes elastic connector instance. Initializes morphological tagger and text rating
+        prediction model, irrelevant model. Domain bipolar bert models are loaded lazily by model registry.
         :param con: instance of elastic connector
+        :param batch_size: maximum count of sentences evaluated by model in one forward pass
+        :param memory_budget: memory budget in bytes for resident domain models, 0 means unlimited
+        :param path: path to models
+        :param salient_cache: cache of category -> set of salient lemmas, invalidated by experiment controller
+        :param inference_cache: cache of model outputs of cleared sentences
+        :param review_writer: background writer of analyses computed on request to reviews, None disables write-back
+        :param scheduler_config: dictionary of model name or 'default' -> {'max_batch': int, 'max_wait_ms': float} for
+        micro-batching of concurrent requests, None evaluates each request separately
+        :param quantized: names of bert models (general, regression, domain names or all) served with int8 dynamic
+        quantization
         """
         self.connector = con
-        path = '../model/'
+        self.salient_cache = salient_cache or TTLCache()
+        self.inference_cache = inference_cache or InferenceCache(':memory:')
+        self.review_writer = review_writer
+        # model name -> version of loaded model files
+        self.versions = {}
+        self.scheduler_config = scheduler_config
+        self.schedulers = {}
+        self._schedulers_lock = threading.Lock()
+        self.batch_size = batch_size
+        self.path = path
+        self.quantized = set(quantized or [])
 
         self.re_int = re.compile(r'^[-+]?([1-9]\d*|0)$')
         self.tagger = MorphoTagger()
@@ -41,45 +71,187 @@ class ReviewController:
         self.pos_con_labels = ['0', '1']
         self.irrelevant_model = SVM_Classifier('../model/')
         self.irrelevant_model.load_models()
-        self.pos_con_model = Bert_model(path + 'bert_bipolar',
-                                        self.pos_con_labels)
-        self.pos_con_model.do_eval()
+        self._register_version('irrelevant')
+        self.pos_con_model = self._prepare_model('general', Bert_model(path + 'bert_bipolar',
+                                                                       self.pos_con_labels))
+        self._register_version('general')
 
-        self.regression_model = Bert_model(path + 'bert_regression', [])
-        self.regression_model.do_eval()
-        self.model_d = self._load_models(path, self.pos_con_labels)
-        self.model_d['general'] = self.pos_con_model
+        self.regression_model = self._prepare_model('regression', Bert_model(path + 'bert_regression', []))
+        self._register_version('regression')
+        self.model_d = self._load_models(memory_budget)
+        self.model_d.pin('general', self.pos_con_model)
 
-    def _load_models(self, path: str, labels: list):
+    def _load_models(self, memory_budget: int):
         """
-        Load all bipolar models located in path.
-        :param path: path to models
-        :param labels: used labels
-        :return:
+        Register all domain bipolar models located in path, models are loaded on first use.
+        :param memory_budget: memory budget in bytes for resident domain models
+        :return: ModelRegistry
         """
-        d = {
-        }
-        indexes = [
-            'elektronika',
-            'bile_zbozi',
-            'dum_a_zahrada',
-            'chovatelstvi',
-            'auto-moto',
-            'detske_zbozi',
-            'obleceni_a_moda',
-            'filmy_knihy_hry',
-            'kosmetika_a_zdravi',
-            'sport',
-            'hobby',
-            'jidlo_a_napoje',
-            'stavebniny',
-            'sexualni_a_eroticke_pomucky',
-        ]
-        for value in indexes:
-            d[value] = Bert_model(path + 'bert_bipolar_domain/' + value, labels)
-            d[value].do_eval()
-
-        return d
+        registry = ModelRegistry(self._load_domain_model, memory_budget)
+        for value in DOMAIN_INDEXES:
+            registry.register(value)
+
+        return registry
+
+    def _load_domain_model(self, name: str):
+        """
+        Load domain bipolar model, its version is read from files independently of loading (see __version).
+        :param name: name of domain
+        :return: Bert_model
+        """
+        return self._prepare_model(name, Bert_model(self.path + 'bert_bipolar_domain/' + name, self.pos_con_labels))
+
+    def _is_quantized(self, name: str):
+        """
+        Check if model is served with int8 dynamic quantization.
+        :param name: name of model
+        :return: bool
+        """
+        return name in self.quantized or 'all' in self.quantized
+
+    def _prepare_model(self, name: str, model: Bert_model):
+        """
+        Switch loaded model to evaluation mode and quantize it if it is configured.
+        :param name: name of model
+        :param model: loaded Bert model
+        :return: Bert_model
+        """
+        model.do_eval()
+        if self._is_quantized(name):
+            model = quantize_model(model)
+        return model
+
+    def _file_version(self, name: str):
+        """
+        Get version of model from its files, quantized model has its own version, because its outputs differ.
+        :param name: name of model
+        :return: str
+        """
+        version = model_version(self._model_path(name))
+        if self._is_quantized(name):
+            version += '-int8'
+        return version
+
+    def _model_path(self, name: str):
+        """
+        Get path to files of model.
+        :param name: name of model
+        :return: str
+        """
+        if name == 'irrelevant':
+            return '../model/'
+        if name == 'general':
+            return self.path + 'bert_bipolar'
+        if name == 'regression':
+            return self.path + 'bert_regression'
+        return self.path + 'bert_bipolar_domain/' + name
+
+    def _register_version(self, name: str):
+        """
+        Store version of loaded model, cached outputs of its other versions are dropped.
+        :param name: name of model
+        """
+        self.versions[name] = self._file_version(name)
+        self.inference_cache.register(name, self.versions[name])
+
+    def __version(self, name: str):
+        """
+        Get version of model, version of model, which was not loaded yet, is read from its files and registered in
+        inference cache, so that lookups do not depend on loading of model.
+        :param name: name of model
+        :return: str
+        """
+        if name not in self.versions:
+            self._register_version(name)
+        return self.versions[name]
+
+    def __is_current(self, review: dict, key: str, names: list):
+        """
+        Check if analysis stored in review can be reused. Analyses written back by this controller are tagged with
+        versions of models and they are reused only if they were computed by current models.
+        :param review: review dictionary
+        :param key: name of analysis field
+        :param names: names of models used to compute analysis
+        :return: bool
+        """
+        if key not in review:
+            return False
+        stored = review.get('model_versions', {})
+        return all(stored.get(name, self.__version(name)) == self.__version(name) for name in names)
+
+    def __write_back(self, review: dict, data: dict, keys: list, names: list):
+        """
+        Queue write of computed analyses to review document, request does not wait for it.
+        :param review: review dictionary
+        :param data: analysed review dictionary
+        :param keys: names of computed analysis fields
+        :param names: names of models used to compute them
+        """
+        if not self.review_writer or not keys:
+            return
+        fields = {key: data[key] for key in keys}
+        fields['model_versions'] = dict(review.get('model_versions', {}))
+        fields['model_versions'].update((name, self.__version(name)) for name in names)
+        self.review_writer.put(review.get('_id', ''), fields, review.get('_index'))
+
+    def __cached_eval(self, name: str, sentences: list, evaluate):
+        """
+        Get outputs of model for sentences from inference cache, missing sentences are evaluated and cached.
+        :param name: name of model, whose version is registered
+        :param sentences: list of cleared sentences
+        :param evaluate: callable(list of sentences) -> list of outputs
+        :return: dict sentence -> output
+        """
+        version = self.__version(name)
+        found = self.inference_cache.get_many(name, version, sentences)
+        missing = [sentence for sentence in dict.fromkeys(sentences) if sentence not in found]
+        if missing:
+            computed = dict(zip(missing, evaluate(missing)))
+            self.inference_cache.put_many(name, version, computed)
+            found.update(computed)
+
+        return found
+
+    def __model(self, name: str):
+        """
+        Get bert model by name.
+        :param name: regression or name of bipolar model in model registry
+        :return: Bert_model
+        """
+        if name == 'regression':
+            return self.regression_model
+        return self.model_d.get(name)
+
+    def __scheduler(self, name: str, use_labels: bool):
+        """
+        Get micro-batching scheduler of model, scheduler is created on first use.
+        :param name: name of model
+        :param use_labels: use labels (not in regression task)
+        :return: InferenceScheduler
+        """
+        with self._schedulers_lock:
+            if name not in self.schedulers:
+                config = dict(self.scheduler_config.get('default', {}))
+                config.update(self.scheduler_config.get(name, {}))
+                max_batch = config.get('max_batch', self.batch_size)
+                # model is taken from registry for each batch, so that scheduler does not keep evicted model alive
+                self.schedulers[name] = InferenceScheduler(
+                    lambda batch: eval_sentences(self.__model(name), batch, use_labels, max_batch),
+                    max_batch=max_batch, max_wait=config.get('max_wait_ms', 2) / 1000.0, name=name)
+            return self.schedulers[name]
+
+    def __infer(self, name: str, sentences: list, use_labels: bool = True):
+        """
+        Evaluate sentences with bert model, sentences are coalesced with sentences of concurrent requests if
+        schedulers are enabled.
+        :param name: name of model
+        :param sentences: list of cleared sentences
+        :param use_labels: use labels (not in regression task)
+        :return: list of outputs in order of sentences
+        """
+        if self.scheduler_config is None:
+            return eval_sentences(self.__model(name), sentences, use_labels, self.batch_size)
+        return self.__scheduler(name, use_labels).evaluate(sentences)
 
     def __clear_sentence(self, sentence: str) -> str:
         """
@@ -95,16 +267,41 @@ class ReviewController:
 
         return sentence
 
-    def __eval_sentence(self, model: Bert_model, sentence: str, useLabels: bool = True):
+    def __eval_sentence(self, name: str, sentence: str, useLabels: bool = True):
         """
-        Evaluate sentence with bipolar model.
-        :param model: Bert bipolar model
+        Evaluate sentence with bert model, output is taken from inference cache if possible. Without schedulers
+        sentence is evaluated by eval_example of model.
+        :param name: name of model
         :param sentence: list of sentences
         :param useLabels: use labels (not in regression task)
         :return: text, label
         """
         sentence = self.__clear_sentence(sentence)
-        return sentence, model.eval_example('a', sentence, useLabels)
+        if self.scheduler_config is None:
+            evaluate = lambda missing: [self.__model(name).eval_example('a', s, useLabels) for s in missing]
+        else:
+            evaluate = lambda missing: self.__infer(name, missing, useLabels)
+        labels = self.__cached_eval(name, [sentence], evaluate)
+        return sentence, labels[sentence]
+
+    def __eval_models(self, names: list, sentences: list, evaluated: dict):
+        """
+        Evaluate cleared sentences with every model from names list in batches. Each (model, sentence) pair is
+        evaluated only once, even if the sentence repeats or the model was already used earlier in the request.
+        :param names: list of model names from model registry
+        :param sentences: list of cleared sentences
+        :param evaluated: cache of already evaluated sentences: name -> {sentence: label}, updated in place
+        :return: dictionary of name -> {sentence: label}
+        """
+        out = {}
+        for name in names:
+            labels = evaluated.setdefault(name, {})
+            missing = [s for s in dict.fromkeys(sentences) if s not in labels]
+            if missing:
+                labels.update(self.__cached_eval(name, missing, lambda batch: self.__infer(name, batch)))
+            out[name] = labels
+
+        return out
 
     def merge_review_text(self, pos: list, con: list, summary: str):
         """
@@ -120,23 +317,65 @@ class ReviewController:
         text += [summary]
         return ' '.join(text)
 
-    def __salient(self, s: str, salient: list):
+    def __get_salient_words(self, category: str):
         """
-        Mark salient words in salient list.
-        :param s:
-        :param salient:
-        :return:
+        Get salient lemmas of experiment of category, sets are cached until experiment of category changes.
+        :param category: name of category
+        :return: frozenset of lemmas, empty if category does not have experiment
+        """
+        salient = self.salient_cache.get(category)
+        if salient is None:
+            exp, _ = self.connector.get_experiments_by_category(category)
+            salient = frozenset(exp[0]['sal_con'] + exp[0]['sal_pos']) if exp else frozenset()
+            self.salient_cache.set(category, salient)
+
+        return salient
+
+    def __tag_sentences(self, sentences: list):
+        """
+        Perform pos tagging of sentences in one tagger call, tokens are split back to sentences by their text. If
+        tokens can not be aligned with sentences, the remaining sentences are tagged separately.
+        :param sentences: list of cleared sentences
+        :return: list of WordPos {lemma, tag, token} lists, one per sentence
+        """
+        if not sentences:
+            return []
+        tokens = [wp for sentence_wp_list in self.tagger.pos_tagging(' '.join(sentences), False, False)
+                  for wp in sentence_wp_list]
+
+        out = []
+        position = 0
+        for sentence in sentences:
+            target = ''.join(sentence.split())
+            taken = []
+            text = ''
+            while position < len(tokens) and len(text) < len(target):
+                text += ''.join(tokens[position].token.split())
+                taken.append(tokens[position])
+                position += 1
+            if text != target:
+                break
+            out.append(taken)
+
+        for sentence in sentences[len(out):]:
+            out.append([wp for sentence_wp_list in self.tagger.pos_tagging(sentence, False, False)
+                        for wp in sentence_wp_list])
+
+        return out
+
+    def __salient(self, sentence_wp_list: list, salient: frozenset):
+        """
+        Mark salient words in tagged sentence.
+        :param sentence_wp_list: list of WordPos {lemma, tag, token}
+        :param salient: set of salient lemmas
+        :return: text of sentence with marked salient nouns
         """
         sentence_out = []
-        # get list of WordPos {lemma, tag, token}
-        sentence_pos_list = self.tagger.pos_tagging(s, False, False)
-        # find salient words in wordpos list and mark them
-        for sentence_wp_list in sentence_pos_list:
-            for wp in sentence_wp_list:
-                if wp.lemma in salient and wp.tag[0] in ['N']:
-                    sentence_out.append('<b>' + wp.token + '</b>')
-                else:
-                    sentence_out.append(wp.token)
+        for wp in sentence_wp_list:
+            if wp.lemma in salient and wp.tag[0] in ['N']:
+                sentence_out.append('<b>' + wp.token + '</b>')
+            else:
+                sentence_out.append(wp.token)
         sentence = ' '.join(sentence_out)
         return sentence
 
@@ -148,6 +387,106 @@ class ReviewController:
         """
         return round(round(number * 100.0, -1))
 
+    def score_reviews(self, reviews: list):
+        """
+        Compute analyses of reviews, which are missing or were computed by other versions of models, in the same way
+        as review analysis does. Models evaluate sentences of all reviews in batches, domain models are run only if
+        some review lacks pos_model or con_model. Used by offline scoring.
+        :param reviews: list of review dictionaries with pros, cons, summary and stored analyses
+        :return: list of partial review documents with computed fields tagged with model versions, None for reviews
+        which can not be scored (empty review) or do not need scoring
+        """
+        names = self.model_d.names()
+        prepared = []
+        for review in reviews:
+            try:
+                text = self.merge_review_text(review['pros'], review['cons'], review['summary'])
+                # review analysis rejects empty review in the same way
+                if not text:
+                    raise KeyError('Empty review')
+                keys = [key for key, models in [('rating_model', ['regression']), ('pos_model', names),
+                                                 ('con_model', names)]
+                        if not self.__is_current(review, key, models)]
+                prepared.append((text, [self.__clear_sentence(sentence) for sentence in review['pros']],
+                                 [self.__clear_sentence(sentence) for sentence in review['cons']], keys)
+                                if keys else None)
+            except Exception as e:
+                print('ExperimentController-score_reviews: {}'.format(str(e)), file=sys.stderr)
+                prepared.append(None)
+
+        valid = [p for p in prepared if p]
+        texts = [text for text, _, _, keys in valid if 'rating_model' in keys]
+        ratings = {}
+        if texts:
+            ratings = self.__cached_eval('regression', texts, lambda batch: self.__infer('regression', batch, False))
+        domain_sentences = [s for _, pros, cons, keys in valid
+                            for key, section in [('pos_model', pros), ('con_model', cons)] if key in keys
+                            for s in section]
+        domain = {}
+        if domain_sentences:
+            domain = self.__eval_models(names, domain_sentences, {})
+
+        out = []
+        for review, item in zip(reviews, prepared):
+            if not item:
+                out.append(None)
+                continue
+            text, pros, cons, keys = item
+            fields = {}
+            used = []
+            if 'rating_model' in keys:
+                fields['rating_model'] = '{}%'.format(self.__round_percentage(ratings[text]))
+                used.append('regression')
+            for key, section in [('pos_model', pros), ('con_model', cons)]:
+                if key in keys:
+                    fields[key] = [[[labels[s], category + '_model'] for category, labels in domain.items()]
+                                   for s in section]
+                    used += [name for name in names if name not in used]
+            fields['model_versions'] = dict(review.get('model_versions', {}))
+            fields['model_versions'].update((name, self.__version(name)) for name in used)
+            out.append(fields)
+
+        return out
+
+    def compare_quantized(self, name: str, reviews: list):
+        """
+        Compare outputs of fp32 model and its int8 dynamically quantized copy on reviews. Bipolar models are compared
+        on pros/cons sentences by label agreement, regression model on review texts by mean absolute error.
+        :param name: name of bert model
+        :param reviews: list of review dictionaries with pros, cons and summary
+        :return: dictionary with accuracy, latency and size of both variants
+        """
+        regression = name == 'regression'
+        if regression:
+            sentences = [self.merge_review_text(r['pros'], r['cons'], r['summary']) for r in reviews]
+        else:
+            sentences = [self.__clear_sentence(s) for r in reviews for s in r['pros'] + r['cons'] if s.strip()]
+
+        fp32 = Bert_model(self._model_path(name), [] if regression else self.pos_con_labels)
+        fp32.do_eval()
+        variants = {'fp32': fp32, 'int8': quantize_model(fp32)}
+        outputs = {}
+        report = {'model': name, 'sentences': len(sentences)}
+        for variant, model in variants.items():
+            start = time.time()
+            outputs[variant] = eval_sentences(model, sentences, not regression, self.batch_size)
+            elapsed = time.time() - start
+            report[variant] = {
+                'size_mb': round(module_size(model.model) / 1024 ** 2, 1),
+                'sentences_per_s': round(len(sentences) / elapsed, 1) if elapsed else 0.0,
+            }
+
+        pairs = list(zip(outputs['fp32'], outputs['int8']))
+        if not pairs:
+            return report
+        if regression:
+            report['mae'] = round(sum(abs(a - b) for a, b in pairs) / len(pairs), 5)
+            report['rating_mae'] = round(sum(abs(self.__round_percentage(a) - self.__round_percentage(b))
+                                             for a, b in pairs) / len(pairs), 3)
+        else:
+            report['label_agreement'] = round(sum(a == b for a, b in pairs) / len(pairs), 4)
+        return report
+
     def get_review_experiment(self, config):
         """
         Perform analysis on review object according to config dictionary. Analysis consists of bipolar
@@ -168,86 +507,69 @@ class ReviewController:
             review = self.connector.get_review_by_id(config['_id'], config['category'])
             if not review:
                 raise ValueError('Review was not found')
+            review.setdefault('_id', config['_id'])
+            computed = []
+            computed_models = []
 
             # not all reviews are processed with rating prediction model
-            if 'rating_model' not in review:
+            if not self.__is_current(review, 'rating_model', ['regression']):
                 review_text = self.merge_review_text(review['pros'], review['cons'], review['summary'])
                 if review_text:
-                    _, rating = self.__eval_sentence(self.regression_model, review_text, useLabels=False)
+                    _, rating = self.__eval_sentence('regression', review_text, useLabels=False)
 
                     rating = self.__round_percentage(rating)
                     data['rating_model'] = '{}%'.format(rating)
+                    computed.append('rating_model')
+                    computed_models.append('regression')
                 else:
                     raise KeyError('Empty review')
             else:
                 data['rating_model'] = review['rating_model']
 
             # marking of salient words from experiment of products subcategory or shop.
-            exp, _ = self.connector.get_experiments_by_category(config['category'])
-            topic_words = []
-            if exp:
-                exp = exp[0]
-                topic_words = exp['sal_con'] + exp['sal_pos']
-
-            # evaluate each sentence of review pros section with general bipolar model, mark salient  words
-            for sentence in review['pros']:
-                s, label = self.__eval_sentence(self.pos_con_model, sentence)
-                if topic_words:
-                    s = self.__salient(s, topic_words)
-                data['pos_labels'].append({
-                    'sentence': s,
-                    'label': label
-                })
-            # evaluate each sentence of review cons section with general bipolar model, mark salient  words
-            for sentence in review['cons']:
-                s, label = self.__eval_sentence(self.pos_con_model, sentence)
-                if topic_words:
-                    s = self.__salient(s, topic_words)
-                data['con_labels'].append({
-                    'sentence': s,
-                    'label': label
-                })
-
-            # pos model is evaluation of sentence by all domain models
-            # if exists copy it
-            if 'pos_model' in review:
-                data['pos_model'] = review['pos_model']
-            else:
-                # else evaluate each sentence of pros section with all domain models
-                for sentence in review['pros']:
-                    model_review = []
-
-                    for category, model in self.model_d.items():
-                        s, label = self.__eval_sentence(model, sentence)
-                        model_review.append([label, category + '_model'])
-
-                    data['pos_model'].append(model_review)
-
-            # con model is the same as pos_model but for negative sentences
-            if 'con_model' in review:
-                data['con_model'] = review['con_model']
-            else:
-                # evaluate each sentence of cons section with all domain models
-                for sentence in review['cons']:
-                    model_review = []
-
-                    for category, model in self.model_d.items():
-                        s, label = self.__eval_sentence(model, sentence)
-                        model_review.append([label, category + '_model'])
+            topic_words = self.__get_salient_words(config['category'])
 
-                    data['con_model'].append(model_review)
-            # for summary section evaluate each sentence it with general bipolar model and mark all salient words
+            pros = [self.__clear_sentence(sentence) for sentence in review['pros']]
+            cons = [self.__clear_sentence(sentence) for sentence in review['cons']]
+            summary = []
             if review['summary']:
-                for sentence in sent_tokenize(review['summary'], 'czech'):
-                    sentence, label = self.__eval_sentence(self.pos_con_model, sentence)
-                    if topic_words:
-                        sentence = self.__salient(sentence, topic_words)
-
-                    data['summary_labels'].append({
-                        'sentence': sentence,
-                        'label': label
+                summary = [self.__clear_sentence(s) for s in sent_tokenize(review['summary'], 'czech')]
+
+            # evaluate all sentences of review with general bipolar model in one batch
+            evaluated = {}
+            general = self.__eval_models(['general'], pros + cons + summary, evaluated)['general']
+
+            # pos/con model is evaluation of sentence by all domain models, if exists copy it
+            domain_names = self.model_d.names()
+            domain_sentences = []
+            for key, section in [('pos_model', pros), ('con_model', cons)]:
+                if not self.__is_current(review, key, domain_names):
+                    domain_sentences += section
+                    computed.append(key)
+            domain = {}
+            if domain_sentences:
+                domain = self.__eval_models(domain_names, domain_sentences, evaluated)
+                computed_models += domain_names
+
+            # mark salient words of each sentence of pros, cons and summary section, whole review is tagged at once
+            tagged = iter(self.__tag_sentences(pros + cons + summary) if topic_words else [])
+            for key, section in [('pos_labels', pros), ('con_labels', cons), ('summary_labels', summary)]:
+                for sentence in section:
+                    s = self.__salient(next(tagged), topic_words) if topic_words else sentence
+                    data[key].append({
+                        'sentence': s,
+                        'label': general[sentence]
                     })
 
+            for key, section in [('pos_model', pros), ('con_model', cons)]:
+                if key not in computed:
+                    data[key] = review[key]
+                else:
+                    for sentence in section:
+                        data[key].append([[labels[sentence], category + '_model']
+                                          for category, labels in domain.items()])
+
+            self.__write_back(review, data, computed, computed_models)
             return data, ret_code
 
         except KeyError as e:
@@ -272,15 +594,15 @@ class ReviewController:
         ret_code = 200
         try:
             try:
-                model = self.model_d[config['model_type']]
+                # unknown model name raises
+                self.model_d.get(config['model_type'])
                 data['model_type'] = config['model_type']
             # wrong model name -> use general
             except Exception as e:
                 print('ExperimentController-get_polarity_sentence: {}'.format(str(e)), file=sys.stderr)
-                model = self.model_d['general']
                 data['model_type'] = 'general'
 
-            _, data['polarity'] = self.__eval_sentence(model, config['sentence'])
+            _, data['polarity'] = self.__eval_sentence(data['model_type'], config['sentence'])
 
             return data, ret_code
 
@@ -288,6 +610,24 @@ class ReviewController:
             print('ExperimentController-get_polarity_sentence: {}'.format(str(e)), file=sys.stderr)
             return {'error': str(e), 'error_code': 500}, 500
 
+    def get_models_status(self):
+        """
+        Report registered and resident bipolar models and hit rate of inference cache.
+        :return: dict with model registry and inference cache statistics, return code
+        """
+        try:
+            data = self.model_d.stats()
+            data['inference_cache'] = self.inference_cache.stats()
+            if self.review_writer:
+                data['write_back'] = self.review_writer.stats()
+            data['schedulers'] = {name: scheduler.stats() for name, scheduler in self.schedulers.items()}
+            data['quantized'] = sorted(self.quantized)
+            return data, 200
+
+        except Exception as e:
+            print('ExperimentController-get_models_status: {}'.format(str(e)), file=sys.stderr)
+            return {'error': str(e), 'error_code': 500}, 500
+
     def get_text_rating(self, config):
         """
         Evaluate rating of text with bert prediction model.
@@ -297,7 +637,7 @@ class ReviewController:
         data = {}
         ret_code = 200
         try:
-            _, rating = self.__eval_sentence(self.regression_model, config['text'], useLabels=False)
+            _, rating = self.__eval_sentence('regression', config['text'], useLabels=False)
             data['rating_f'] = rating
             data['rating'] = self.__round_percentage(rating)
 
@@ -316,7 +656,10 @@ class ReviewController:
         data = {}
         ret_code = 200
         try:
-            label_str = self.irrelevant_model.eval_example(config['text'])
+            text = config['text']
+            label_str = self.__cached_eval('irrelevant', [text],
+                                           lambda missing: [self.irrelevant_model.eval_example(t)
+                                                            for t in missing])[text]
             data['label'] = label_str
             return data, ret_code
 
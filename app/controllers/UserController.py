@@ -7,15 +7,27 @@ Author: xkloco00@stud.fit.vutbr.cz
 
 from werkzeug.security import check_password_hash
 
+from review_analysis.utils.elastic_connector import Connector
 from .Controller import Controller
 from app.models import User
+from app.utils.TTLCache import TTLCache
 import sys
 
 
 class UserController(Controller):
     """
-    Controller handles user authentication.
+    Controller handles user authentication. Users verified by tokens are cached for ttl seconds.
     """
+    def __init__(self, con: Connector, cache_ttl: float = 300, cache_size: int = 1024):
+        """
+        Constructor method takes elastic connector instance and creates user cache.
+        :param con: instance of elastic connector
+        :param cache_ttl: time to live of cached user in seconds
+        :param cache_size: maximum count of cached users
+        """
+        super().__init__(con)
+        self.cache = TTLCache(cache_ttl, cache_size)
+
     def create_user(self, content: dict):
         """
         Create new user, who's information are specified in content dictionary and index him to elasticsaerch.
@@ -27,6 +39,7 @@ class UserController(Controller):
             if content['name'] and content['password'] and content['level']:
                 res = self.connector.index('users', content)
                 self.connector.es.indices.refresh(index="users")
+                self.invalidate_user(content['name'])
                 data = self.connector.get_user_by_id(res['_id'])
                 return data, ret_code
             else:
@@ -38,15 +51,21 @@ class UserController(Controller):
 
     def get_user(self, name: str):
         """
-        Get user by name.
+        Get user by name, user is served from cache if possible.
         :param name:
         :return: user: User object
         """
         try:
+            user = self.cache.get(name)
+            if user:
+                return user
+
             user_d = self.connector.get_user_by_name(name)
-            user = User(user_d['name'], user_d['level'], user_d['password_hash'])
-            user._id = user_d['_id']
+            if not user_d:
+                return None
 
+            user = User.from_stored(user_d['name'], user_d['level'], user_d['password_hash'], user_d['_id'])
+            self.cache.set(name, user)
             return user
         except Exception as e:
             print('ExperimentController-get_user: {}'.format(str(e)), file=sys.stderr)
@@ -69,6 +88,18 @@ class UserController(Controller):
         if not user or not check_password_hash(user['password_hash'], password):
             return None
 
-        u = User(user['name'], user['level'], user['password_hash'])
-        u._id = user['_id']
-        return u
+        return User.from_stored(user['name'], user['level'], user['password_hash'], user['_id'])
+
+    def invalidate_user(self, name: str):
+        """
+        Remove user from cache, has to be called whenever user is changed or removed.
+        :param name:
+        """
+        self.cache.invalidate(name)
+
+    def get_cache_stats(self):
+        """
+        Get statistics of user cache.
+        :return: dict, return code
+        """
+        return self.cache.stats(), 200
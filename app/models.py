@@ -20,6 +20,18 @@ class User(UserMixin):
         self.level = level
         self.password_hash = generate_password_hash(password, method='sha256')
 
+    @classmethod
+    def from_stored(cls, name, level, password_hash, _id=''):
+        """
+        Create user from stored data, password hash is used as it is without hashing.
+        """
+        user = cls.__new__(cls)
+        user.name = name
+        user.level = level
+        user.password_hash = password_hash
+        user._id = _id
+        return user
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
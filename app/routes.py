@@ -6,12 +6,14 @@ Author: xkloco00@stud.fit.vutbr.cz
 """
 
 from app import app, product_cnt, generate_cnt, data_cnt, experiment_cluster_cnt, review_cnt, user_cnt
-from flask import request, send_file, current_app
+from flask import request, current_app, Response, stream_with_context
 from flask_restx import Resource, fields
 import jwt
 from datetime import datetime, timedelta
 from functools import wraps
 
+from app.utils.DocumentCache import SerializedDocument
+
 # name spaces
 data_ns = app.namespace('data', description='Handles non essential data')
 product_ns = app.namespace('product', description='Handles product/shop and review extraction from elastic')
@@ -26,6 +28,13 @@ actualization_statistic_model = app.model('actualization_statistic_model',
                                               'category': fields.String(required=True,
                                                                         description="Product category")
                                           })
+breadcrumbs_children_model = app.model('breadcrumbs_children_model',
+                                       {
+                                           'path': fields.List(required=True,
+                                                               description="Names of nodes from root (excluded) "
+                                                                           "to expanded node, empty for root",
+                                                               cls_or_instance=fields.String)
+                                       })
 product_model = app.model('product_model',
                           {
                               'category_name': fields.String(required=True,
@@ -38,12 +47,38 @@ product_review_model = app.model('product_review_model',
                                      'domain': fields.String(required=True,
                                                              description="Domain of the product or shop")
                                  })
+product_review_page_model = app.model('product_review_page_model',
+                                      {
+                                          'name': fields.String(required=True,
+                                                                description="Name of the product or shop"),
+                                          'domain': fields.String(required=True,
+                                                                  description="Domain of the product or shop"),
+                                          'size': fields.Integer(required=False,
+                                                                 description="Count of reviews in page"),
+                                          'sort': fields.String(required=False,
+                                                                description="Sort field: date (default)"),
+                                          'order': fields.String(required=False,
+                                                                 description="Sort order: desc (default), asc"),
+                                          'after': fields.String(required=False,
+                                                                 description="Cursor of next page from previous "
+                                                                             "response"),
+                                          'fields': fields.List(required=False,
+                                                                description="Returned fields of reviews",
+                                                                cls_or_instance=fields.String)
+                                      })
 product_url_model = app.model('product_url_model',
                               {
                                   'url': fields.String(required=True,
                                                        description="Url of product")
                               })
 
+product_urls_model = app.model('product_urls_model',
+                               {
+                                   'urls': fields.List(required=True,
+                                                       description="Urls of products",
+                                                       cls_or_instance=fields.String)
+                               })
+
 generate_data_model = app.model('generate_data_model',
                                 {
                                     'model_type': fields.String(required=True,
@@ -62,6 +97,10 @@ generate_data_model = app.model('generate_data_model',
                                                                       description="Sentence minimum length"),
                                     'sentence_max_len': fields.String(required=True,
                                                                       description="Sentence maximum length"),
+                                    'compression': fields.String(required=False,
+                                                                 description="Compression of zip archive: "
+                                                                             "deflate (default), stored, bzip2, "
+                                                                             "lzma, zstd"),
                                 })
 
 experiment_review_model = app.model('experiment_review_model',
@@ -107,7 +146,11 @@ experiment_model = app.model('experiment_cluster_model',
                                  'clusters_con_count': fields.Integer(required=True,
                                                                       description="Count of negative clusters"),
                                  'topics_per_cluster': fields.Integer(required=True,
-                                                                      description="Count of topics per cluster")
+                                                                      description="Count of topics per cluster"),
+                                 'sample_size': fields.Integer(required=False,
+                                                               description="Count of sentences clustered, the rest is "
+                                                                           "assigned to the nearest cluster, requires "
+                                                                           "embedding cache")
                              })
 
 experiment_delete_model = app.model('experiment_delete_model',
@@ -116,6 +159,12 @@ experiment_delete_model = app.model('experiment_delete_model',
                                                                        description="ID of experiment")
                                     })
 
+experiment_refresh_model = app.model('experiment_refresh_model',
+                                     {
+                                         'experiment_id': fields.String(required=True,
+                                                                        description="ID of experiment")
+                                     })
+
 experiment_update_model = app.model('experiment_update_model',
                                     {
                                         'cluster_id': fields.String(required=True,
@@ -242,7 +291,11 @@ def token_required(f):
             return invalid_msg, 401
 
         try:
-            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'],
+                              options={'require_exp': True, 'require_iat': True})
+            # check claims before looking up the user
+            if not isinstance(data.get('sub'), str) or not data['sub']:
+                raise jwt.InvalidTokenError('Missing subject claim')
 
             user = user_cnt.get_user(data['sub'])
 
@@ -258,6 +311,28 @@ def token_required(f):
     return _verify
 
 
+def document_response(document: SerializedDocument):
+    """
+    Create response from pre-serialized document, supports ETag/If-None-Match and gzip encoding.
+    :param document: pre-serialized document
+    :return: flask Response
+    """
+    gzipped = 'gzip' in request.accept_encodings
+    etag = document.gzip_etag if gzipped else document.etag
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    elif gzipped:
+        response = Response(document.gzip_body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(document.body, mimetype='application/json')
+
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding, Authorization'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @data_ns.route('/indexes_health')
 class IndexesHealth(Resource):
     @token_required
@@ -270,6 +345,17 @@ class IndexesHealth(Resource):
         return data, ret_code
 
 
+@data_ns.route('/user_cache')
+class UserCache(Resource):
+    @token_required
+    def get(self):
+        """
+        Get hit and miss statistics of cache of authenticated users.
+        """
+        data, ret_code = user_cnt.get_cache_stats()
+        return data, ret_code
+
+
 @data_ns.route('/breadcrumbs')
 class BreadcrumbsFull(Resource):
     @token_required
@@ -277,8 +363,23 @@ class BreadcrumbsFull(Resource):
         """
         Get full breadcrumb path of all products.
         """
-        data, ret_code = data_cnt.get_breadcrumbs()
-        return [data], ret_code
+        data, ret_code = data_cnt.get_breadcrumbs_document()
+        if ret_code != 200:
+            return data, ret_code
+        return document_response(data)
+
+
+@data_ns.route('/breadcrumbs/children')
+class BreadcrumbsChildren(Resource):
+    @app.expect(breadcrumbs_children_model)
+    @token_required
+    def post(self):
+        """
+        Get node of breadcrumb tree and its children with their children counts for lazy expansion.
+        """
+        path = request.json.get('path', [])
+        data, ret_code = data_cnt.get_breadcrumbs_children(path)
+        return data, ret_code
 
 
 @data_ns.route('/actualization_statistics')
@@ -314,8 +415,10 @@ class ProductBreadcrumbs(Resource):
         """
         Get simplified breadcrumbs of domain and subcategory for products as a tree.
         """
-        data, ret_code = product_cnt.get_breadcrumbs()
-        return [data], ret_code
+        data, ret_code = product_cnt.get_breadcrumbs_document()
+        if ret_code != 200:
+            return data, ret_code
+        return document_response(data)
 
 
 @product_ns.route('/review')
@@ -331,6 +434,24 @@ class ProductReviews(Resource):
         return data, ret_code
 
 
+@product_ns.route('/review/page')
+class ProductReviewsPage(Resource):
+    @app.expect(product_review_page_model)
+    @token_required
+    def post(self):
+        """
+        Return page of product reviews with cursor of next page, with Accept: application/x-ndjson all reviews from
+        the cursor are streamed as newline delimited json.
+        """
+        content = request.json
+        if request.accept_mimetypes.best == 'application/x-ndjson':
+            return Response(stream_with_context(product_cnt.stream_product_reviews(content)),
+                            mimetype='application/x-ndjson')
+
+        data, ret_code = product_cnt.get_product_reviews_page(content)
+        return data, ret_code
+
+
 @product_ns.route('/image')
 class ProductImg(Resource):
     @app.expect(product_url_model)
@@ -346,6 +467,20 @@ class ProductImg(Resource):
         return data, ret_code
 
 
+@product_ns.route('/images')
+class ProductImages(Resource):
+    @app.expect(product_urls_model)
+    @token_required
+    def post(self):
+        """
+        Get urls of pictures of list of products from heureka site.
+        """
+        content = request.json
+        data, ret_code = product_cnt.get_product_image_urls(content['urls'])
+
+        return data, ret_code
+
+
 @product_ns.route('/statistics')
 class ProductStatistics(Resource):
     @app.expect(product_review_model)
@@ -366,17 +501,16 @@ class GenerateDataset(Resource):
     @token_required
     def post(self):
         """
-        Export dataset according to given arguments, returns a zip file.
+        Export dataset according to given arguments, returns a zip file streamed in chunks.
         """
         content = request.json
         data, ret_code = generate_cnt.generate_dataset(content)
 
         if ret_code == 200:
-            return send_file(
-                data,
+            return Response(
+                stream_with_context(data),
                 mimetype='application/zip',
-                as_attachment=True,
-                attachment_filename='data.zip'
+                headers={'Content-Disposition': 'attachment; filename=data.zip'}
             )
         else:
             return data, ret_code
@@ -410,6 +544,18 @@ class ExperimentSentencePosCon(Resource):
         return data, ret_code
 
 
+@experiment_ns.route('/models')
+class ExperimentModels(Resource):
+    @token_required
+    def get(self):
+        """
+        Get registered and currently loaded bipolar bert models and hit rate of inference cache.
+        """
+        data, ret_code = review_cnt.get_models_status()
+
+        return data, ret_code
+
+
 @experiment_ns.route('/text_rating')
 class ExperimentTextRating(Resource):
     @app.expect(experiment_demo_model)
@@ -466,10 +612,10 @@ class Experiment(Resource):
     @token_required
     def post(self):
         """
-        Perform clustering experiment according to given data.
+        Enqueue clustering experiment according to given data, returns job which state is polled on /experiment/job.
         """
         content = request.json
-        data, ret_code = experiment_cluster_cnt.cluster_similarity(content)
+        data, ret_code = experiment_cluster_cnt.start_cluster_similarity(content)
 
         return data, ret_code
 
@@ -484,6 +630,40 @@ class Experiment(Resource):
         return data, ret_code
 
 
+@experiment_ns.route('/job/<string:job_id>')
+class ExperimentJob(Resource):
+    @token_required
+    def get(self, job_id):
+        """
+        Get phase, progress and elapsed time of clustering experiment job.
+        """
+        data, ret_code = experiment_cluster_cnt.get_job(job_id)
+        return data, ret_code
+
+    @token_required
+    def delete(self, job_id):
+        """
+        Cancel clustering experiment job.
+        """
+        data, ret_code = experiment_cluster_cnt.cancel_job(job_id)
+        return data, ret_code
+
+
+@experiment_ns.route('/refresh')
+class ExperimentRefresh(Resource):
+    @app.expect(experiment_refresh_model)
+    @token_required
+    def post(self):
+        """
+        Enqueue assignment of sentences crawled since the last update to existing clusters and topics of experiment,
+        returns job which state is polled on /experiment/job. Requires embedding cache (EMBEDDING_CACHE_DIR), otherwise
+        returns 400.
+        """
+        content = request.json
+        data, ret_code = experiment_cluster_cnt.start_update_experiment(content)
+        return data, ret_code
+
+
 @experiment_ns.route('/cluster_merge')
 class ExperimentClusterMerge(Resource):
     @app.expect(experiment_cluster_merge_model)
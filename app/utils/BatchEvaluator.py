@@ -0,0 +1,167 @@
+"""
+This file contains implementation of batched evaluation of sentences with bert models. Sentences are tokenized once,
+sorted by length and evaluated in padded batches instead of one forward pass per sentence. Batched evaluation relies on
+internals of Bert_model (tokenizer, torch module, labels), so the first batch of each model is checked against
+eval_example and models, whose internals are missing or whose outputs differ, are evaluated example by example.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import sys
+
+import torch
+
+from review_analysis.clasification.bert_model import Bert_model
+
+
+# count of sentences of the first batch compared with eval_example
+CHECK_SIZE = 8
+# maximum absolute difference of regression outputs of batched and single example evaluation
+CHECK_TOLERANCE = 1e-4
+
+
+def _supported(model: Bert_model, use_labels: bool):
+    """
+    Check if model exposes everything batched evaluation needs.
+    :param model: Bert model
+    :param use_labels: labels are needed (not in regression task)
+    :return: bool
+    """
+    required = ['tokenizer', 'model'] + (['labels'] if use_labels else [])
+    return all(getattr(model, attribute, None) is not None for attribute in required)
+
+
+def _matches(expected, actual, use_labels: bool):
+    """
+    Compare output of single example evaluation with output of batched evaluation.
+    :param expected: label or rating from eval_example
+    :param actual: label or rating from batch
+    :param use_labels: outputs are labels (not in regression task)
+    :return: bool
+    """
+    if use_labels:
+        return str(expected) == str(actual)
+    try:
+        return abs(float(expected) - float(actual)) <= CHECK_TOLERANCE
+    except (TypeError, ValueError):
+        return False
+
+
+def _check(model: Bert_model, sentences: list, results: list, use_labels: bool):
+    """
+    Compare batched outputs of the shortest and the longest sentences with eval_example.
+    :param model: Bert model
+    :param sentences: list of evaluated sentences
+    :param results: batched outputs in order of sentences
+    :param use_labels: use labels (not in regression task)
+    :return: bool, True if all compared outputs match
+    """
+    order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+    sample = sorted(set(order[:CHECK_SIZE // 2] + order[-(CHECK_SIZE - CHECK_SIZE // 2):]))
+    for i in sample:
+        expected = model.eval_example('a', sentences[i], use_labels)
+        if not _matches(expected, results[i], use_labels):
+            print('BatchEvaluator: batched output {!r} differs from eval_example {!r}, model is evaluated example by '
+                  'example'.format(results[i], expected), file=sys.stderr)
+            return False
+    return True
+
+
+def _tokenize(model: Bert_model, sentence: str, max_len: int):
+    """
+    Convert sentence to list of token ids in the same way as single example evaluation does ([CLS] text [SEP]).
+    :param model: Bert model with tokenizer
+    :param sentence: text to be tokenized
+    :param max_len: maximum sequence length
+    :return: list of token ids
+    """
+    tokens = model.tokenizer.tokenize(sentence)[:max_len - 2]
+    tokens = ['[CLS]'] + tokens + ['[SEP]']
+    return model.tokenizer.convert_tokens_to_ids(tokens)
+
+
+def _forward(model: Bert_model, batch: list):
+    """
+    Run one padded batch of token ids through the model.
+    :param model: Bert model
+    :param batch: list of token id lists
+    :return: logits as torch tensor [batch, labels]
+    """
+    device = getattr(model, 'device', torch.device('cpu'))
+    max_len = max(len(ids) for ids in batch)
+    input_ids = torch.zeros((len(batch), max_len), dtype=torch.long)
+    input_mask = torch.zeros((len(batch), max_len), dtype=torch.long)
+    for i, ids in enumerate(batch):
+        input_ids[i, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+        input_mask[i, :len(ids)] = 1
+    segment_ids = torch.zeros_like(input_ids)
+
+    with torch.no_grad():
+        out = model.model(input_ids.to(device), token_type_ids=segment_ids.to(device),
+                          attention_mask=input_mask.to(device))
+    # transformers returns tuple/ModelOutput, pytorch_pretrained_bert returns logits
+    if hasattr(out, 'logits'):
+        out = out.logits
+    elif isinstance(out, (tuple, list)):
+        out = out[0]
+    return out.detach().cpu()
+
+
+def eval_sentences(model: Bert_model, sentences: list, use_labels: bool = True, batch_size: int = 32):
+    """
+    Evaluate list of sentences with bert model in padded batches. The first batch of model is compared with
+    eval_example, models failing the check or missing tokenizer, torch module or labels are evaluated example by
+    example.
+    :param model: Bert model (bipolar or regression)
+    :param sentences: list of cleared sentences
+    :param use_labels: return labels (not in regression task)
+    :param batch_size: maximum size of one batch
+    :return: list of labels/ratings in the same order as sentences
+    """
+    if not sentences:
+        return []
+
+    # result of check is stored on model instance: use_labels -> bool
+    checked = model.__dict__.setdefault('batch_checked', {})
+    if not _supported(model, use_labels) or checked.get(use_labels) is False:
+        return [model.eval_example('a', sentence, use_labels) for sentence in sentences]
+
+    try:
+        results = _eval_batches(model, sentences, use_labels, batch_size)
+    except Exception as e:
+        print('BatchEvaluator: {}, model is evaluated example by example'.format(str(e)), file=sys.stderr)
+        checked[use_labels] = False
+        return [model.eval_example('a', sentence, use_labels) for sentence in sentences]
+
+    if use_labels not in checked:
+        checked[use_labels] = _check(model, sentences, results, use_labels)
+        if not checked[use_labels]:
+            return [model.eval_example('a', sentence, use_labels) for sentence in sentences]
+
+    return results
+
+
+def _eval_batches(model: Bert_model, sentences: list, use_labels: bool, batch_size: int):
+    """
+    Evaluate sentences in padded batches sorted by length.
+    :param model: Bert model with tokenizer, torch module and labels
+    :param sentences: list of cleared sentences
+    :param use_labels: return labels (not in regression task)
+    :param batch_size: maximum size of one batch
+    :return: list of labels/ratings in the same order as sentences
+    """
+    max_len = getattr(model, 'max_seq_length', 128)
+    encoded = [_tokenize(model, sentence, max_len) for sentence in sentences]
+    # sort by length so that batches need minimal padding
+    order = sorted(range(len(encoded)), key=lambda i: len(encoded[i]))
+    results = [None] * len(sentences)
+
+    for start in range(0, len(order), batch_size):
+        indexes = order[start:start + batch_size]
+        logits = _forward(model, [encoded[i] for i in indexes])
+        for row, index in enumerate(indexes):
+            if use_labels:
+                results[index] = model.labels[int(torch.argmax(logits[row]))]
+            else:
+                results[index] = float(logits[row][0])
+
+    return results
@@ -0,0 +1,103 @@
+"""
+This file contains implementation of DocumentCache class, which keeps response document pre-serialized as json and
+gzip bytes with its ETag. Document is rebuilt only when version of its source index changes.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import gzip
+import hashlib
+import json
+import sys
+import threading
+import time
+
+from review_analysis.utils.elastic_connector import Connector
+
+
+class SerializedDocument:
+    """
+    Pre-serialized response document.
+    """
+
+    def __init__(self, data):
+        """
+        Serialize data to json and gzip bytes.
+        :param data: json serializable data
+        """
+        self.data = data
+        self.body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.gzip_body = gzip.compress(self.body)
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        # gzip body is a different representation, so it needs its own strong ETag
+        self.gzip_etag = self.etag + '-gzip'
+        self.created = time.time()
+
+
+class DocumentCache:
+    """
+    Cache of one document built by builder function from elasticsearch index. Version of index is checked at most once
+    per check_interval seconds and document is rebuilt if it changed.
+    """
+
+    def __init__(self, con: Connector, builder, index: str, check_interval: float = 60, wrap=None):
+        """
+        Constructor method.
+        :param con: instance of elastic connector
+        :param builder: callable() -> (data, return code)
+        :param index: name of index, which changes invalidate document
+        :param check_interval: minimal count of seconds between index version checks
+        :param wrap: optional callable, which converts data before serialization
+        """
+        self.connector = con
+        self.builder = builder
+        self.index = index
+        self.check_interval = check_interval
+        self.wrap = wrap
+        self.document = None
+        self.version = None
+        self.checked = 0.0
+        self._lock = threading.Lock()
+
+    def index_version(self):
+        """
+        Get version of index from its statistics (count of documents and indexing/deletion operations).
+        :return: tuple or None if statistics are not available
+        """
+        try:
+            stats = self.connector.es.indices.stats(index=self.index, metric='docs,indexing')
+            primaries = stats['_all']['primaries']
+            return (primaries['docs']['count'], primaries['docs']['deleted'],
+                    primaries['indexing']['index_total'], primaries['indexing']['delete_total'])
+        except Exception as e:
+            print('DocumentCache-index_version: {}'.format(str(e)), file=sys.stderr)
+            return None
+
+    def invalidate(self):
+        """
+        Force rebuild of document on next request.
+        """
+        with self._lock:
+            self.document = None
+
+    def get(self):
+        """
+        Get serialized document, rebuild it if index changed or version is not available.
+        :return: SerializedDocument or error dictionary, return code
+        """
+        with self._lock:
+            now = time.time()
+            if self.document and now - self.checked < self.check_interval:
+                return self.document, 200
+
+            version = self.index_version()
+            self.checked = now
+            if self.document and version is not None and version == self.version:
+                return self.document, 200
+
+            data, ret_code = self.builder()
+            if ret_code != 200:
+                return data, ret_code
+
+            self.document = SerializedDocument(self.wrap(data) if self.wrap else data)
+            self.version = version
+            return self.document, 200
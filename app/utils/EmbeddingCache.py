@@ -0,0 +1,130 @@
+"""
+This file contains implementation of EmbeddingCache class, content addressed cache of sentence embeddings. Vectors of
+each embedding model are stored as append only float32 matrix, which is memory mapped, and index file with hash of
+lemma sequence per row. More processes can read the cache, appends are serialized by file lock.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import fcntl
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+
+def lemma_hash(lemmas: list):
+    """
+    Get content hash of lemma sequence.
+    :param lemmas: list of lemmas
+    :return: str
+    """
+    return hashlib.sha1('\x1f'.join(lemmas).encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Cache of sentence vectors of one embedding model: <name>.f32 (rows of float32 vectors) and <name>.idx (dimension
+    on the first line, then one hash per row).
+    """
+
+    def __init__(self, directory: str, name: str, dim: int):
+        """
+        Constructor method opens or creates cache files.
+        :param directory: directory of cache files
+        :param name: name of embedding model
+        :param dim: dimension of vectors
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.dim = dim
+        self.data_path = os.path.join(directory, name + '.f32')
+        self.index_path = os.path.join(directory, name + '.idx')
+        self.lock_path = os.path.join(directory, name + '.lock')
+        self.rows = {}
+        self.matrix = None
+        self._index_offset = 0
+        self._lock = threading.Lock()
+
+        with self.__file_lock():
+            if not os.path.exists(self.index_path):
+                with open(self.index_path, 'w') as f:
+                    f.write('{}\n'.format(dim))
+                open(self.data_path, 'wb').close()
+        self.__reload()
+
+    @contextmanager
+    def __file_lock(self):
+        """
+        Hold exclusive lock of cache shared by processes.
+        """
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def __reload(self):
+        """
+        Read rows appended by other processes and map data file.
+        """
+        with open(self.index_path) as f:
+            if not self._index_offset:
+                dim = int(f.readline())
+                if dim != self.dim:
+                    raise ValueError('Cache {} has dimension {}, expected {}'.format(self.index_path, dim, self.dim))
+                self._index_offset = f.tell()
+            f.seek(self._index_offset)
+            for line in iter(f.readline, ''):
+                if not line.endswith('\n'):
+                    # row index is being written by another process
+                    break
+                self.rows[line[:-1]] = len(self.rows)
+                self._index_offset = f.tell()
+
+        if self.rows:
+            self.matrix = np.memmap(self.data_path, dtype=np.float32, mode='r', shape=(len(self.rows), self.dim))
+
+    def get(self, hashes: list):
+        """
+        Get vectors of hashes, rows are copied out of memory mapped matrix.
+        :param hashes: list of lemma hashes
+        :return: matrix [len(hashes), dim] with zeros for missing vectors, list of indexes of missing hashes
+        """
+        with self._lock:
+            if any(h not in self.rows for h in hashes):
+                self.__reload()
+            found = [(i, self.rows[h]) for i, h in enumerate(hashes) if h in self.rows]
+            out = np.zeros((len(hashes), self.dim), dtype=np.float32)
+            if found:
+                positions, rows = zip(*found)
+                out[list(positions)] = self.matrix[list(rows)]
+            found_set = set(i for i, _ in found)
+            return out, [i for i in range(len(hashes)) if i not in found_set]
+
+    def append(self, hashes: list, vectors: np.ndarray):
+        """
+        Append vectors of new hashes, vectors are written before index, so that readers never see unwritten rows.
+        :param hashes: list of lemma hashes
+        :param vectors: matrix [len(hashes), dim]
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock, self.__file_lock():
+            self.__reload()
+            new = []
+            seen = set(self.rows)
+            for i, h in enumerate(hashes):
+                if h not in seen:
+                    seen.add(h)
+                    new.append(i)
+            if not new:
+                return
+            with open(self.data_path, 'r+b') as f:
+                # drop rows of interrupted append, which are not in index
+                f.truncate(len(self.rows) * self.dim * 4)
+                f.seek(0, os.SEEK_END)
+                f.write(vectors[new].tobytes())
+            with open(self.index_path, 'a') as f:
+                f.write(''.join(hashes[i] + '\n' for i in new))
+            self.__reload()
@@ -12,3 +12,12 @@ class WrongProperty(Exception):
 
     def __str__(self):
         return self.message
+
+
+class JobCancelled(Exception):
+    def __init__(self, message='Job was cancelled'):
+        super().__init__(message)
+        self.message = message
+
+    def __str__(self):
+        return self.message
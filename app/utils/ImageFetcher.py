@@ -0,0 +1,170 @@
+"""
+This file contains implementation of ImageFetcher class, which resolves products image url from products page on
+heureka site. Resolved urls (and missing images) are stored in persistent sqlite cache, pages are downloaded by
+connection pool and parsing stops at the first table cell.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import codecs
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+
+import urllib3
+
+
+class FirstCellImageParser(HTMLParser):
+    """
+    Find src of the first img within the first td element of document, parsing stops when it is decided.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.depth = 0
+        self.done = False
+        self.src = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'td':
+            self.depth += 1
+        elif tag == 'img' and self.depth:
+            self.src = dict(attrs).get('src')
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == 'td' and self.depth and not self.done:
+            self.depth -= 1
+            # first cell ended without image
+            if not self.depth:
+                self.done = True
+
+
+class ImageUrlCache:
+    """
+    Persistent cache of product url -> image url, missing images are cached as None with shorter ttl.
+    """
+
+    def __init__(self, path: str, ttl: float, negative_ttl: float):
+        """
+        Constructor method creates sqlite table if it does not exist.
+        :param path: path to sqlite file
+        :param ttl: time to live of found image url in seconds
+        :param negative_ttl: time to live of missing image in seconds
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS image_url '
+                            '(url TEXT PRIMARY KEY, src TEXT, fetched REAL NOT NULL)')
+
+    def get(self, url: str):
+        """
+        Get cached image url.
+        :param url: url of product
+        :return: tuple (found in cache, src or None)
+        """
+        with self._lock:
+            row = self.db.execute('SELECT src, fetched FROM image_url WHERE url = ?', (url,)).fetchone()
+        if not row:
+            return False, None
+
+        src, fetched = row
+        ttl = self.ttl if src else self.negative_ttl
+        if time.time() - fetched > ttl:
+            return False, None
+        return True, src
+
+    def set(self, url: str, src):
+        """
+        Store image url of product, None marks missing image.
+        :param url: url of product
+        :param src: image url or None
+        """
+        with self._lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO image_url (url, src, fetched) VALUES (?, ?, ?)',
+                            (url, src, time.time()))
+
+
+class ImageFetcher:
+    """
+    Resolves products image urls with persistent cache and bounded pool of connections and workers.
+    """
+
+    def __init__(self, cache_path: str, ttl: float = 7 * 24 * 3600, negative_ttl: float = 24 * 3600,
+                 workers: int = 8, timeout: float = 10, chunk_size: int = 16 * 1024):
+        """
+        Constructor method.
+        :param cache_path: path to sqlite cache file
+        :param ttl: time to live of found image url in seconds
+        :param negative_ttl: time to live of missing image in seconds
+        :param workers: count of concurrent downloads
+        :param timeout: timeout of download in seconds
+        :param chunk_size: size of read chunk of page in bytes
+        """
+        self.cache = ImageUrlCache(cache_path, ttl, negative_ttl)
+        self.http = urllib3.PoolManager(maxsize=workers, block=True,
+                                        timeout=urllib3.Timeout(total=timeout), retries=urllib3.Retry(2))
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.chunk_size = chunk_size
+
+    def fetch(self, url: str):
+        """
+        Download product page until image in first table cell is found.
+        :param url: url of product
+        :return: image url or None if page or image does not exist
+        """
+        response = self.http.request('GET', url, preload_content=False)
+        try:
+            if response.status == 404:
+                return None
+            if response.status >= 400:
+                raise IOError('HTTP {} for {}'.format(response.status, url))
+
+            parser = FirstCellImageParser()
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            for chunk in response.stream(self.chunk_size):
+                parser.feed(decoder.decode(chunk))
+                if parser.done:
+                    # rest of page is not read, connection can not be reused
+                    response.close()
+                    break
+            return parser.src
+        finally:
+            response.release_conn()
+
+    def get(self, url: str):
+        """
+        Get image url of product from cache or download it.
+        :param url: url of product
+        :return: image url or None if product does not have image
+        """
+        found, src = self.cache.get(url)
+        if found:
+            return src
+
+        src = self.fetch(url)
+        self.cache.set(url, src)
+        return src
+
+    def get_many(self, urls: list):
+        """
+        Resolve image urls of products concurrently, failed downloads are reported as None and not cached.
+        :param urls: list of urls of products
+        :return: dict url -> image url or None
+        """
+        def resolve(url):
+            try:
+                return self.get(url)
+            except Exception as e:
+                print('ImageFetcher-get_many: {}'.format(str(e)), file=sys.stderr)
+                return None
+
+        unique = list(dict.fromkeys(urls))
+        return dict(zip(unique, self.executor.map(resolve, unique)))
@@ -0,0 +1,134 @@
+"""
+This file contains implementation of InferenceCache class, two tier cache of model outputs: in-process LRU in front of
+persistent sqlite store. Entries are keyed by model name, model version and cleared sentence, version is derived from
+model files, so that retrained model does not use results of the previous one.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+from .TTLCache import TTLCache
+
+# marker of entry missing in memory tier
+_MISSING = object()
+
+
+def model_version(path: str):
+    """
+    Get version of model from names, sizes and modification times of its files.
+    :param path: path to model directory or file, only files directly in directory are considered
+    :return: str
+    """
+    if os.path.isdir(path):
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    else:
+        files = [path]
+
+    entries = []
+    for file in files:
+        if os.path.isfile(file):
+            stat = os.stat(file)
+            entries.append('{}:{}:{}'.format(os.path.basename(file), stat.st_size, int(stat.st_mtime)))
+    return hashlib.sha1('|'.join(entries).encode('utf-8')).hexdigest()[:12]
+
+
+class InferenceCache:
+    """
+    Cache of (model, version, sentence) -> output of model. Outputs must be json serializable (labels, ratings).
+    """
+
+    def __init__(self, path: str, memory_size: int = 100000):
+        """
+        Constructor method creates sqlite table if it does not exist.
+        :param path: path to sqlite file, ':memory:' keeps the second tier in memory too
+        :param memory_size: maximum count of entries of in-process tier
+        """
+        self.memory = TTLCache(ttl=0, max_size=memory_size)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self.db:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS inference '
+                            '(model TEXT NOT NULL, version TEXT NOT NULL, sentence TEXT NOT NULL, value TEXT NOT NULL, '
+                            'PRIMARY KEY (model, version, sentence))')
+
+    def register(self, model: str, version: str):
+        """
+        Remove stored outputs of other versions of model.
+        :param model: name of model
+        :param version: current version of model
+        """
+        with self._lock, self.db:
+            self.db.execute('DELETE FROM inference WHERE model = ? AND version != ?', (model, version))
+
+    def get_many(self, model: str, version: str, sentences: list):
+        """
+        Get cached outputs of sentences, outputs found on disk are promoted to memory.
+        :param model: name of model
+        :param version: version of model
+        :param sentences: list of cleared sentences
+        :return: dict sentence -> output for found sentences
+        """
+        found = {}
+        missing = []
+        for sentence in dict.fromkeys(sentences):
+            value = self.memory.get((model, version, sentence), _MISSING)
+            if value is _MISSING:
+                missing.append(sentence)
+            else:
+                found[sentence] = value
+
+        stored = {}
+        if missing:
+            with self._lock:
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    rows = self.db.execute('SELECT sentence, value FROM inference WHERE model = ? AND version = ? '
+                                           'AND sentence IN ({})'.format(','.join('?' * len(chunk))),
+                                           [model, version] + chunk).fetchall()
+                    stored.update((sentence, json.loads(value)) for sentence, value in rows)
+            for sentence, value in stored.items():
+                self.memory.set((model, version, sentence), value)
+
+        with self._lock:
+            self.memory_hits += len(found)
+            self.disk_hits += len(stored)
+            self.misses += len(missing) - len(stored)
+        found.update(stored)
+        return found
+
+    def put_many(self, model: str, version: str, values: dict):
+        """
+        Store outputs of sentences in both tiers.
+        :param model: name of model
+        :param version: version of model
+        :param values: dict sentence -> output
+        """
+        for sentence, value in values.items():
+            self.memory.set((model, version, sentence), value)
+        rows = [(model, version, sentence, json.dumps(value, default=lambda o: o.item()))
+                for sentence, value in values.items()]
+        with self._lock, self.db:
+            self.db.executemany('INSERT OR REPLACE INTO inference VALUES (?, ?, ?, ?)', rows)
+
+    def stats(self):
+        """
+        Get hit statistics of both tiers.
+        :return: dict
+        """
+        with self._lock:
+            total = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_size': self.memory.stats()['size'],
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,160 @@
+"""
+This file contains implementation of InferenceScheduler class, which coalesces sentences of concurrent requests into
+batches for one model. Worker thread takes queued sentences until batch is full or the first sentence waited max_wait
+seconds, evaluates them in one forward pass and hands results back to waiting requests. Batch, which can not be
+evaluated, fails all its requests, dead worker thread is restarted and requests wait at most timeout seconds.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class _Request:
+    """
+    Sentences of one caller, which waits until all of them are evaluated.
+    """
+    __slots__ = ['results', 'remaining', 'error', 'done']
+
+    def __init__(self, count: int):
+        self.results = [None] * count
+        self.remaining = count
+        self.error = None
+        self.done = threading.Event()
+
+
+def _bucket(value: int):
+    """
+    Get lower bound of power of two histogram bucket.
+    :param value: non negative integer
+    :return: int
+    """
+    return 1 << (value.bit_length() - 1) if value else 0
+
+
+class InferenceScheduler:
+    """
+    Micro-batching queue in front of model evaluation function.
+    """
+
+    def __init__(self, evaluate, max_batch: int = 32, max_wait: float = 0.002, name: str = '',
+                 timeout: float = 300.0):
+        """
+        Constructor method, worker thread is started on the first request.
+        :param evaluate: callable(list of sentences) -> list of outputs in the same order
+        :param max_batch: maximum count of sentences in one batch
+        :param max_wait: maximum count of seconds the first sentence of batch waits for more sentences
+        :param name: name of model used in thread name and logs
+        :param timeout: maximum count of seconds request waits for its outputs
+        """
+        self.evaluate_batch = evaluate
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.sentences = 0
+        self.batch_sizes = Counter()
+        self.queue_depths = Counter()
+
+    def evaluate(self, sentences: list):
+        """
+        Queue sentences and wait for their outputs.
+        :param sentences: list of cleared sentences
+        :return: list of outputs in order of sentences
+        """
+        if not sentences:
+            return []
+        self.__ensure_worker()
+        request = _Request(len(sentences))
+        for index, sentence in enumerate(sentences):
+            self._queue.put((request, index, sentence))
+
+        deadline = time.monotonic() + self.timeout
+        # worker is checked periodically, sentences of batch of dead worker would never be answered
+        while not request.done.wait(min(1.0, max(deadline - time.monotonic(), 0.0))):
+            if not self._thread.is_alive():
+                self.__ensure_worker()
+                raise RuntimeError('Inference worker of model {} stopped'.format(self.name))
+            if time.monotonic() >= deadline:
+                raise TimeoutError('Inference of model {} timed out after {} s'.format(self.name, self.timeout))
+        if request.error:
+            raise request.error
+        return request.results
+
+    def __ensure_worker(self):
+        """
+        Start worker thread if it was not started yet or if it died.
+        """
+        with self._lock:
+            if not self._thread or not self._thread.is_alive():
+                if self._thread:
+                    print('InferenceScheduler-{}: worker thread stopped, restarting'.format(self.name),
+                          file=sys.stderr)
+                self._thread = threading.Thread(target=self.__run, name='inference-' + self.name, daemon=True)
+                self._thread.start()
+
+    def __next_batch(self):
+        """
+        Take the next batch of queued sentences, waits for the first one without timeout.
+        :return: list of (request, index, sentence)
+        """
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def __run(self):
+        """
+        Evaluate batches and dispatch outputs to requests.
+        """
+        while True:
+            batch = self.__next_batch()
+            with self._lock:
+                self.batches += 1
+                self.sentences += len(batch)
+                self.batch_sizes[_bucket(len(batch))] += 1
+                self.queue_depths[_bucket(self._queue.qsize())] += 1
+
+            try:
+                outputs = self.evaluate_batch([sentence for _, _, sentence in batch])
+                if len(outputs) != len(batch):
+                    raise RuntimeError('Model returned {} outputs for {} sentences'.format(len(outputs), len(batch)))
+                for (request, index, _), output in zip(batch, outputs):
+                    request.results[index] = output
+                    request.remaining -= 1
+                    if not request.remaining:
+                        request.done.set()
+            except Exception as e:
+                print('InferenceScheduler-{}: {}'.format(self.name, str(e)), file=sys.stderr)
+                for request, _, _ in batch:
+                    request.error = e
+                    request.done.set()
+
+    def stats(self):
+        """
+        Get histograms of batch sizes and queue depths after batch was taken, keys are lower bounds of power of two
+        buckets.
+        :return: dict
+        """
+        with self._lock:
+            return {
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'queue_depth': self._queue.qsize(),
+                'batches': self.batches,
+                'mean_batch_size': round(self.sentences / self.batches, 2) if self.batches else 0.0,
+                'batch_size_histogram': {str(k): v for k, v in sorted(self.batch_sizes.items())},
+                'queue_depth_histogram': {str(k): v for k, v in sorted(self.queue_depths.items())},
+            }
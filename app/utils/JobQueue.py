@@ -0,0 +1,197 @@
+"""
+This file contains implementation of JobQueue class, which runs long tasks (clustering experiments) on bounded local
+executor, so that API requests return immediately and clients poll for the progress.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .Exceptions import JobCancelled
+
+
+class Job:
+    """
+    State of one background task: phase, progress within phase, result or error. Task checks for cancellation
+    by calling check().
+    """
+
+    def __init__(self, phases: list = None):
+        """
+        Constructor method takes list of phase names, which are used to compute overall percentage.
+        :param phases: ordered list of phase names
+        """
+        self.id = uuid.uuid4().hex
+        self.phases = phases or []
+        self.phase = 'queued'
+        self.status = 'queued'
+        self.done = 0
+        self.total = 0
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def set_phase(self, phase: str, total: int = 0):
+        """
+        Move job to the next phase.
+        :param phase: name of phase
+        :param total: count of steps in phase
+        """
+        self.check()
+        self.phase = phase
+        self.done = 0
+        self.total = total
+
+    def advance(self, steps: int = 1):
+        """
+        Mark steps of current phase as done, phase can be advanced from more threads.
+        :param steps: count of finished steps
+        """
+        self.check()
+        with self._lock:
+            self.done += steps
+
+    def cancel(self):
+        """
+        Request cancellation, task is stopped at the next check.
+        """
+        self._cancel.set()
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        """
+        Raise JobCancelled if cancellation was requested.
+        """
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def percent(self):
+        """
+        Compute overall percentage of job from finished phases and progress of current phase.
+        :return: float
+        """
+        if self.status == 'finished':
+            return 100.0
+        if self.phase not in self.phases:
+            return 0.0
+        fraction = self.done / self.total if self.total else 0.0
+        return round((self.phases.index(self.phase) + min(fraction, 1.0)) / len(self.phases) * 100.0, 2)
+
+    def to_dict(self):
+        """
+        Get json serializable representation of job.
+        :return: dict
+        """
+        start = self.started or time.time()
+        end = self.finished or time.time()
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'phase': self.phase,
+            'done': self.done,
+            'total': self.total,
+            'percent': self.percent(),
+            'elapsed': round(end - start, 2) if self.started else 0.0,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class JobQueue:
+    """
+    Bounded queue of background jobs executed by thread pool.
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = 8, keep_finished: int = 3600):
+        """
+        Constructor method.
+        :param workers: count of jobs executed concurrently
+        :param max_pending: maximum count of queued and running jobs
+        :param keep_finished: count of seconds for which finished jobs are kept for polling
+        """
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def __prune(self):
+        """
+        Remove finished jobs older than keep_finished.
+        """
+        now = time.time()
+        for job_id in [k for k, job in self.jobs.items() if job.finished and now - job.finished > self.keep_finished]:
+            del self.jobs[job_id]
+
+    def pending(self):
+        """
+        Get count of queued and running jobs.
+        :return: int
+        """
+        return len([job for job in self.jobs.values() if not job.finished])
+
+    def submit(self, fn, *args, phases: list = None):
+        """
+        Submit function to executor, function is called as fn(*args, job) and its return value is stored as result.
+        :param fn: task function
+        :param args: arguments of function
+        :param phases: ordered list of phases of task
+        :return: Job
+        """
+        with self._lock:
+            self.__prune()
+            if self.pending() >= self.max_pending:
+                raise OverflowError('Too many pending jobs')
+            job = Job(phases)
+            self.jobs[job.id] = job
+
+        self.executor.submit(self.__run, job, fn, args)
+        return job
+
+    def __run(self, job: Job, fn, args):
+        """
+        Execute job and store its result or error.
+        """
+        job.started = time.time()
+        job.status = 'running'
+        try:
+            job.check()
+            job.result = fn(*args, job)
+            job.status = 'finished'
+        except JobCancelled as e:
+            job.status = 'cancelled'
+            job.error = str(e)
+        except Exception as e:
+            print('JobQueue-run: {}'.format(str(e)), file=sys.stderr)
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id: str):
+        """
+        Get job by its id.
+        :param job_id:
+        :return: Job or None
+        """
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str):
+        """
+        Request cancellation of job.
+        :param job_id:
+        :return: Job or None
+        """
+        job = self.jobs.get(job_id)
+        if job and not job.finished:
+            job.cancel()
+        return job
@@ -0,0 +1,90 @@
+"""
+This file contains implementation of LemmaStore class, persistent sqlite store of pos tagging results of review
+sentences. Each entry keeps hash of sentence text, so that entry of changed review is tagged again.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+
+
+class LemmaStore:
+    """
+    Persistent store of (review_id, sentence_type, sentence_index) -> (count of sentences, lemmas of sentence).
+    Writes are buffered and flushed in batches.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 1000):
+        """
+        Constructor method creates sqlite table if it does not exist.
+        :param path: path to sqlite file
+        :param buffer_size: count of buffered entries, after which they are written
+        """
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self.db:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS lemma '
+                            '(review_id TEXT NOT NULL, sentence_type TEXT NOT NULL, sentence_index INTEGER NOT NULL, '
+                            'text_hash TEXT NOT NULL, sentence_count INTEGER NOT NULL, lemmas TEXT NOT NULL, '
+                            'PRIMARY KEY (review_id, sentence_type, sentence_index))')
+
+    @staticmethod
+    def text_hash(text: str):
+        """
+        Get hash of sentence text.
+        :param text:
+        :return: str
+        """
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def get_review(self, review_id: str, sentence_type: str):
+        """
+        Get stored entries of review sentences of given type.
+        :param review_id: ID of review
+        :param sentence_type: pros/cons
+        :return: dict sentence_index -> (text_hash, sentence_count, lemmas)
+        """
+        with self._lock:
+            rows = self.db.execute('SELECT sentence_index, text_hash, sentence_count, lemmas FROM lemma '
+                                   'WHERE review_id = ? AND sentence_type = ?', (review_id, sentence_type)).fetchall()
+        return {index: (text_hash, count, json.loads(lemmas)) for index, text_hash, count, lemmas in rows}
+
+    def put(self, review_id: str, sentence_type: str, sentence_index: int, text: str, sentence_count: int,
+            lemmas: list):
+        """
+        Store tagging result of sentence, entry is written on flush.
+        :param review_id: ID of review
+        :param sentence_type: pros/cons
+        :param sentence_index: index of sentence in review section
+        :param text: text of sentence
+        :param sentence_count: count of sentences found by tagger
+        :param lemmas: lemmas of the first sentence
+        """
+        with self._lock:
+            self._buffer.append((review_id, sentence_type, sentence_index, self.text_hash(text), sentence_count,
+                                 json.dumps(lemmas, ensure_ascii=False)))
+            if len(self._buffer) < self.buffer_size:
+                return
+        self.flush()
+
+    def flush(self):
+        """
+        Write buffered entries.
+        """
+        with self._lock, self.db:
+            if self._buffer:
+                self.db.executemany('INSERT OR REPLACE INTO lemma VALUES (?, ?, ?, ?, ?, ?)', self._buffer)
+                self._buffer = []
+
+    def invalidate_review(self, review_id: str):
+        """
+        Remove entries of review.
+        :param review_id: ID of review
+        """
+        with self._lock, self.db:
+            self.db.execute('DELETE FROM lemma WHERE review_id = ?', (review_id,))
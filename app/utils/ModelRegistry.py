@@ -0,0 +1,177 @@
+"""
+This file contains implementation of ModelRegistry class, which keeps bert models resident in memory within
+configurable memory budget. Models are loaded on first use and the least recently used ones are evicted. Models are
+loaded outside of registry lock, so that loading of one model does not block lookups of resident ones.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from .Quantization import module_size
+
+
+class ModelRegistry:
+    """
+    Registry of lazily loaded models with LRU eviction. Pinned models are always resident and are not counted into
+    the memory budget.
+    """
+
+    def __init__(self, loader, memory_budget: int = 0, default_size: int = 700 * 1024 ** 2):
+        """
+        Constructor method takes loader function, which creates model from its name.
+        :param loader: callable(name) -> model
+        :param memory_budget: maximum size of resident not pinned models in bytes, 0 means unlimited
+        :param default_size: estimated size of model, whose parameters are not accessible
+        """
+        self.loader = loader
+        self.memory_budget = memory_budget
+        self.default_size = default_size
+        self._names = []
+        self._pinned = {}
+        self._loaded = OrderedDict()
+        self._sizes = {}
+        self._last_used = {}
+        self._lock = threading.RLock()
+        # name -> lock held while model is being loaded, concurrent requests of the same model wait for one load
+        self._load_locks = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def register(self, name: str):
+        """
+        Register name of model, which will be loaded on first use.
+        :param name: name of model
+        """
+        with self._lock:
+            if name not in self._names:
+                self._names.append(name)
+
+    def pin(self, name: str, model):
+        """
+        Register already loaded model, which is never evicted.
+        :param name: name of model
+        :param model: model instance
+        """
+        with self._lock:
+            self.register(name)
+            self._pinned[name] = model
+            self._sizes[name] = self.model_size(model)
+            self._last_used[name] = time.time()
+
+    def names(self):
+        """
+        Get names of all registered models in order of registration.
+        :return: list of names
+        """
+        return list(self._names)
+
+    def __contains__(self, name: str):
+        return name in self._names
+
+    def model_size(self, model):
+        """
+        Estimate memory size of model from its parameters.
+        :param model: model instance
+        :return: size in bytes
+        """
+        try:
+            if getattr(model, 'quantized', False):
+                # packed int8 weights are not parameters of module
+                return module_size(model.model)
+            return sum(p.numel() * p.element_size() for p in model.model.parameters())
+        except AttributeError:
+            return self.default_size
+
+    def get(self, name: str):
+        """
+        Get model by name, load it if it is not resident and evict least recently used models above the budget.
+        :param name: name of model
+        :return: model instance
+        """
+        with self._lock:
+            if name not in self._names:
+                raise KeyError('Model {} is not registered'.format(name))
+            model = self.__resident(name)
+            if model is not None:
+                return model
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                # model could be loaded by other thread while this one waited
+                model = self.__resident(name)
+                if model is not None:
+                    return model
+
+            model = self.loader(name)
+            size = self.model_size(model)
+            with self._lock:
+                self.loads += 1
+                self._last_used[name] = time.time()
+                self._loaded[name] = model
+                self._sizes[name] = size
+                self.__evict(keep=name)
+            return model
+
+    def __resident(self, name: str):
+        """
+        Get resident model and mark it as recently used, registry lock must be held.
+        :param name: name of model
+        :return: model instance or None if it is not resident
+        """
+        if name in self._pinned:
+            self._last_used[name] = time.time()
+            return self._pinned[name]
+        if name in self._loaded:
+            self._last_used[name] = time.time()
+            self._loaded.move_to_end(name)
+            return self._loaded[name]
+        return None
+
+    def __evict(self, keep: str):
+        """
+        Evict least recently used models until resident models fit into memory budget.
+        :param keep: name of model, which can not be evicted
+        """
+        if not self.memory_budget:
+            return
+
+        while self.resident_size() > self.memory_budget:
+            name = next((n for n in self._loaded if n != keep), None)
+            if name is None:
+                break
+            del self._loaded[name]
+            self.evictions += 1
+            print('ModelRegistry: evicted {}'.format(name), file=sys.stderr)
+
+    def resident_size(self):
+        """
+        Get size of resident not pinned models.
+        :return: size in bytes
+        """
+        return sum(self._sizes[name] for name in self._loaded)
+
+    def stats(self):
+        """
+        Report registered and resident models.
+        :return: dictionary with statistics
+        """
+        with self._lock:
+            loaded = [{
+                'name': name,
+                'size': self._sizes[name],
+                'pinned': name in self._pinned,
+                'last_used': self._last_used.get(name),
+            } for name in list(self._pinned) + list(self._loaded)]
+
+            return {
+                'registered': self.names(),
+                'loaded': loaded,
+                'resident_size': self.resident_size(),
+                'memory_budget': self.memory_budget,
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,38 @@
+"""
+This file contains int8 dynamic quantization of bert models for CPU inference. Weights of linear layers are stored as
+int8 and activations are quantized on the fly, embeddings and layer norms stay in fp32.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import copy
+import io
+
+import torch
+
+from review_analysis.clasification.bert_model import Bert_model
+
+
+def quantize_model(model: Bert_model):
+    """
+    Create copy of bert model, whose torch module has dynamically quantized linear layers. Original model is not
+    modified.
+    :param model: Bert model with torch module in attribute model
+    :return: Bert_model
+    """
+    quantized = copy.copy(model)
+    quantized.model = torch.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8)
+    quantized.quantized = True
+    # outputs of quantized module have to be checked against eval_example again
+    quantized.batch_checked = {}
+    return quantized
+
+
+def module_size(module: torch.nn.Module):
+    """
+    Get size of serialized state of torch module, packed quantized weights are included.
+    :param module: torch module
+    :return: size in bytes
+    """
+    buffer = io.BytesIO()
+    torch.save(module.state_dict(), buffer)
+    return buffer.tell()
@@ -0,0 +1,177 @@
+"""
+This file contains implementation of ReviewSearch class, which resolves index and query of product or shop reviews and
+provides cursor pagination over them. Pages are taken from point in time (PIT) of indexes with search_after, PIT keeps
+order of pages stable while reviews are indexed and its _shard_doc tiebreaker makes order of reviews with the same sort
+value deterministic.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import base64
+import json
+
+from elasticsearch import NotFoundError
+from review_analysis.utils.elastic_connector import Connector
+
+from .Exceptions import WrongProperty
+
+
+def decorate_review(review: dict):
+    """
+    Add rating_diff between user and model rating and filter_model metadata to review.
+    :param review: review dictionary
+    :return: review dictionary
+    """
+    # compute rating diff
+    if 'rating_model' in review:
+        review['rating_diff'] = int(review['rating'][:-1]) - int(review['rating_model'][:-1])
+    else:
+        review['rating_diff'] = 0
+    # add filter model metadata
+    if 'filter_model' not in review:
+        review['filter_model'] = False
+    return review
+
+
+def encode_cursor(pit: str, sort_values: list):
+    """
+    Encode point in time and sort values of last hit as opaque cursor.
+    :param pit: id of point in time
+    :param sort_values:
+    :return: str
+    """
+    cursor = {'pit': pit, 'after': sort_values}
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str):
+    """
+    Decode cursor to point in time and sort values.
+    :param cursor:
+    :return: id of point in time, list of sort values
+    """
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return cursor['pit'], list(cursor['after'])
+    except Exception:
+        raise WrongProperty('Invalid cursor')
+
+
+class ReviewSearch:
+    """
+    Search in reviews of product or shop.
+    """
+    # rating is stored as string (80%), which can not be sorted numerically
+    sort_fields = ['date']
+    # fields needed to decorate review
+    decoration_fields = ['rating', 'rating_model', 'filter_model']
+
+    def __init__(self, con: Connector, product_indexes: list, shop_index: str = 'shop_review',
+                 product_field: str = 'product_name', shop_field: str = 'shop_name', max_page_size: int = 1000,
+                 keep_alive: str = '5m'):
+        """
+        Constructor method.
+        :param con: instance of elastic connector
+        :param product_indexes: list of domain indexes with product reviews
+        :param shop_index: index with shop reviews
+        :param product_field: keyword field with name of product
+        :param shop_field: keyword field with name of shop
+        :param max_page_size: maximum count of reviews in one page
+        :param keep_alive: time for which point in time is kept between pages
+        """
+        self.connector = con
+        self.product_indexes = product_indexes
+        self.shop_index = shop_index
+        self.product_field = product_field
+        self.shop_field = shop_field
+        self.max_page_size = max_page_size
+        self.keep_alive = keep_alive
+
+    def target(self, name: str, domain: str):
+        """
+        Get index and query of reviews of product or shop.
+        :param name: name of product or shop
+        :param domain: domain of product or 'shop'
+        :return: index, query
+        """
+        if domain == 'shop':
+            return self.shop_index, {'term': {self.shop_field: name}}
+        return ','.join(self.product_indexes), {'term': {self.product_field: name}}
+
+    def page(self, name: str, domain: str, size: int = 50, sort: str = 'date', order: str = 'desc',
+             after: str = None, fields: list = None):
+        """
+        Get one page of decorated reviews.
+        :param name: name of product or shop
+        :param domain: domain of product or 'shop'
+        :param size: count of reviews in page
+        :param sort: sort field (date)
+        :param order: asc or desc
+        :param after: cursor returned with previous page
+        :param fields: list of returned review fields, None returns whole reviews
+        :return: dict with reviews and cursor of next page (None for the last page)
+        """
+        if sort not in self.sort_fields:
+            raise WrongProperty('Unsupported sort {}, use one of: {}'.format(sort, ', '.join(self.sort_fields)))
+        if order not in ['asc', 'desc']:
+            raise WrongProperty('Unsupported order {}'.format(order))
+        if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+            raise WrongProperty('Fields must be list of field names')
+        size = max(1, min(int(size), self.max_page_size))
+
+        index, query = self.target(name, domain)
+        if after:
+            pit, search_after = decode_cursor(after)
+        else:
+            pit = self.connector.es.open_point_in_time(index=index, keep_alive=self.keep_alive)['id']
+            search_after = None
+
+        body = {
+            'size': size,
+            'query': query,
+            'pit': {'id': pit, 'keep_alive': self.keep_alive},
+            'sort': [{sort: order}, {'_shard_doc': 'asc'}],
+        }
+        if fields:
+            body['_source'] = list(set(fields + self.decoration_fields))
+        if search_after:
+            body['search_after'] = search_after
+
+        try:
+            res = self.connector.es.search(body=body)
+        except NotFoundError:
+            raise WrongProperty('Cursor expired, start from the first page')
+        # id of point in time can change between searches
+        pit = res.get('pit_id', pit)
+        hits = res['hits']['hits']
+
+        reviews = []
+        for hit in hits:
+            review = decorate_review(dict(hit['_source'], _id=hit['_id']))
+            if fields:
+                review = {key: value for key, value in review.items()
+                          if key in fields or key in ['_id', 'rating_diff', 'filter_model']}
+            reviews.append(review)
+
+        cursor = None
+        if len(hits) == size:
+            cursor = encode_cursor(pit, hits[-1]['sort'])
+        else:
+            self.connector.es.close_point_in_time(body={'id': pit})
+
+        return {
+            'reviews': reviews,
+            'next': cursor,
+        }
+
+    def pages(self, name: str, domain: str, size: int = 500, sort: str = 'date', order: str = 'desc',
+              after: str = None, fields: list = None):
+        """
+        Iterate over all reviews page by page.
+        :return: generator of decorated reviews
+        """
+        while True:
+            page = self.page(name, domain, size, sort, order, after, fields)
+            yield from page['reviews']
+            after = page['next']
+            if not after:
+                break
@@ -0,0 +1,138 @@
+"""
+This file contains implementation of ReviewWriter class, which writes fields computed on request (model analyses)
+back to review documents. Updates are queued, coalesced per review and sent by background thread in bulk requests, so
+that request handlers never wait for elasticsearch writes.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import atexit
+import sys
+import threading
+from collections import OrderedDict
+
+from elasticsearch.helpers import streaming_bulk
+
+from review_analysis.utils.elastic_connector import Connector
+
+
+class ReviewWriter:
+    """
+    Background writer of partial review documents. Index of review is looked up in review indexes, if it is not known.
+    """
+
+    def __init__(self, con: Connector, indexes: list, batch_size: int = 100, interval: float = 1.0,
+                 max_pending: int = 10000):
+        """
+        Constructor method, writer thread is started on the first update.
+        :param con: instance of elastic connector
+        :param indexes: list of indexes with reviews
+        :param batch_size: count of reviews, after which updates are sent without waiting for interval
+        :param interval: maximum count of seconds update waits in queue
+        :param max_pending: maximum count of queued reviews, updates above it are dropped
+        """
+        self.connector = con
+        self.indexes = indexes
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        atexit.register(self.flush)
+
+    def put(self, review_id: str, fields: dict, index: str = None):
+        """
+        Queue update of review fields, fields of review already in queue are merged.
+        :param review_id: ID of review
+        :param fields: partial document
+        :param index: index of review if it is known
+        """
+        with self._lock:
+            if review_id not in self._pending and len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            queued_index, queued_fields = self._pending.pop(review_id, (None, {}))
+            queued_fields.update(fields)
+            self._pending[review_id] = (index or queued_index, queued_fields)
+
+            if not self._thread:
+                self._thread = threading.Thread(target=self.__run, name='review-writer', daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+
+    def __run(self):
+        """
+        Send queued updates every interval or when batch is full.
+        """
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def __resolve(self, ids: list):
+        """
+        Find indexes of reviews.
+        :param ids: list of review IDs
+        :return: dict review_id -> index
+        """
+        body = {'query': {'ids': {'values': ids}}, '_source': False, 'size': len(ids)}
+        res = self.connector.es.search(index=','.join(self.indexes), body=body)
+        return {hit['_id']: hit['_index'] for hit in res['hits']['hits']}
+
+    def flush(self):
+        """
+        Send all queued updates in bulk requests.
+        """
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._pending.popitem(last=False) for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    return
+                try:
+                    self.__write(batch)
+                except Exception as e:
+                    print('ReviewWriter-flush: {}'.format(str(e)), file=sys.stderr)
+                    self.failed += len(batch)
+
+    def __write(self, batch: list):
+        """
+        Send one batch of updates.
+        :param batch: list of (review_id, (index, fields))
+        """
+        unknown = [review_id for review_id, (index, _) in batch if not index]
+        found = self.__resolve(unknown) if unknown else {}
+
+        actions = []
+        for review_id, (index, fields) in batch:
+            index = index or found.get(review_id)
+            if not index:
+                self.failed += 1
+                continue
+            actions.append({'_op_type': 'update', '_index': index, '_id': review_id, 'doc': fields})
+
+        for ok, item in streaming_bulk(self.connector.es, actions, raise_on_error=False, raise_on_exception=False):
+            if ok:
+                self.written += 1
+            else:
+                self.failed += 1
+                print('ReviewWriter-write: {}'.format(str(item.get('update', {}).get('error'))), file=sys.stderr)
+
+    def stats(self):
+        """
+        Get counts of written, failed, dropped and queued reviews.
+        :return: dict
+        """
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'written': self.written,
+                'failed': self.failed,
+                'dropped': self.dropped,
+            }
@@ -0,0 +1,108 @@
+"""
+This file contains implementation of SentenceEmbedder class, which computes sentence vectors as mean of word vectors
+of sentence lemmas. Vector of sentence depends only on its lemmas and word vectors, so computed vectors are stored in
+embedding cache and only new sentences are embedded. These vectors differ from sentence embeddings, which FastTextModel
+computes for clustering without cache.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import os
+import sys
+import threading
+
+import numpy as np
+from gensim.models import KeyedVectors
+from gensim.models.fasttext import load_facebook_vectors
+
+from review_analysis.clasification.fasttext_model import EmbeddingModel
+from .EmbeddingCache import EmbeddingCache, lemma_hash
+
+
+class SentenceEmbedder:
+    """
+    Mean word vector sentence embeddings of lemma lists with content addressed cache per embedding model.
+    """
+    # name of embedding, which is reported in clustering info and separates cache files from other embeddings
+    embedding = 'mean_word_vectors'
+
+    def __init__(self, model_paths: dict, cache_dir: str):
+        """
+        Constructor method checks that word vectors exist, they are loaded on first use.
+        :param model_paths: dictionary of EmbeddingModel name -> path to FastText .bin or gensim KeyedVectors file
+        :param cache_dir: directory of embedding cache
+        """
+        if not model_paths:
+            raise ValueError('SentenceEmbedder: no word vectors configured for embedding cache')
+        for name, path in model_paths.items():
+            if not os.path.isfile(path):
+                raise ValueError('SentenceEmbedder: word vectors of {} not found: {}'.format(name, path))
+        self.model_paths = model_paths
+        self.cache_dir = cache_dir
+        self.models = {}
+        self.caches = {}
+        self._lock = threading.Lock()
+
+    def supports(self, embedding_model: EmbeddingModel):
+        """
+        Check if word vectors of embedding model are configured.
+        :param embedding_model:
+        :return: bool
+        """
+        return embedding_model.name in self.model_paths
+
+    def __load(self, embedding_model: EmbeddingModel):
+        """
+        Load word vectors and embedding cache of embedding model.
+        :param embedding_model:
+        :return: KeyedVectors, EmbeddingCache
+        """
+        name = embedding_model.name
+        if not self.supports(embedding_model):
+            raise KeyError('No word vectors configured for embedding model {}'.format(name))
+        with self._lock:
+            if name not in self.models:
+                path = self.model_paths[name]
+                if path.endswith('.bin'):
+                    self.models[name] = load_facebook_vectors(path)
+                else:
+                    self.models[name] = KeyedVectors.load(path, mmap='r')
+                self.caches[name] = EmbeddingCache(self.cache_dir, '{}_{}'.format(name, self.embedding),
+                                                   self.models[name].vector_size)
+            return self.models[name], self.caches[name]
+
+    @staticmethod
+    def __embed_sentence(model: KeyedVectors, lemmas: list):
+        """
+        Compute sentence vector as mean of word vectors, unknown words are skipped.
+        :param model: word vectors
+        :param lemmas: list of lemmas
+        :return: float32 vector
+        """
+        vectors = []
+        for lemma in lemmas:
+            try:
+                vectors.append(model[lemma])
+            except KeyError:
+                pass
+        if not vectors:
+            return np.zeros(model.vector_size, dtype=np.float32)
+        return np.mean(vectors, axis=0).astype(np.float32)
+
+    def embed(self, sentences: list, embedding_model: EmbeddingModel):
+        """
+        Get sentence vectors of lemma lists, only sentences missing in cache are embedded.
+        :param sentences: list of lemma lists
+        :param embedding_model:
+        :return: float32 matrix [len(sentences), dim]
+        """
+        model, cache = self.__load(embedding_model)
+        hashes = [lemma_hash(lemmas) for lemmas in sentences]
+        vectors, missing = cache.get(hashes)
+        if missing:
+            new = np.stack([self.__embed_sentence(model, sentences[i]) for i in missing])
+            vectors[missing] = new
+            cache.append([hashes[i] for i in missing], new)
+
+        print('SentenceEmbedder: {} cached, {} embedded'.format(len(sentences) - len(missing), len(missing)),
+              file=sys.stderr)
+        return vectors
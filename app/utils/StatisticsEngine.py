@@ -0,0 +1,188 @@
+"""
+This file contains implementation of StatisticsEngine class, which computes product/shop statistics (AVG rating,
+AVG recommends, review count per month) by elasticsearch aggregations instead of transferring every review.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import sys
+
+from .ReviewSearch import ReviewSearch
+
+MISSING = '__missing__'
+
+
+def month_key(review: dict):
+    """
+    Get first day of month of review date.
+    :param review: review dictionary
+    :return: date string YYYY-MM-01
+    """
+    return '-'.join(review['date'].split('-')[:2]) + '-01'
+
+
+def month_label(review: dict):
+    """
+    Get month label of review from its date string.
+    :param review: review dictionary
+    :return: month and year string
+    """
+    return ' '.join(review['date_str'].split()[1:])
+
+
+def parse_rating(rating):
+    """
+    Parse rating string like 80%.
+    :param rating:
+    :return: int or None if rating is malformed
+    """
+    try:
+        return int(rating[:-1])
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def format_statistics(sum_rating: int, sum_recommends: int, count: int, dates_d: dict):
+    """
+    Create statistics response from sums.
+    :param sum_rating: sum of valid ratings
+    :param sum_recommends: count of recommending reviews
+    :param count: count of all reviews
+    :param dates_d: dictionary of month key -> {'month': label, 'cnt': count}
+    :return: dict of statistics
+    """
+    review_dates = []
+    for key, value in sorted(dates_d.items()):
+        if value['cnt'] > 0:
+            review_dates.append([value['month'], value['cnt']])
+
+    return {
+        'avg_rating': '{:.2f}%'.format(sum_rating / count),
+        'avg_recommends': '{:.2f}%'.format(sum_recommends / count * 100),
+        'review_dates': review_dates,
+    }
+
+
+def python_statistics(reviews: list):
+    """
+    Compute statistics from list of reviews, reviews with malformed rating are counted only into total count.
+    :param reviews: list of review dictionaries
+    :return: dict of statistics
+    """
+    sum_rating = 0
+    sum_recommends = 0
+    dates_d = {}
+    for review in reviews:
+        try:
+            sum_rating += int(review['rating'][:-1])
+            date_str = month_key(review)
+
+            if date_str not in dates_d:
+                dates_d[date_str] = {
+                    'month': month_label(review),
+                    'cnt': 0
+                }
+            dates_d[date_str]['cnt'] += 1
+            if review['recommends'] == 'YES':
+                sum_recommends += 1
+
+        except Exception as e:
+            # some reviews has empty ratings...
+            pass
+
+    return format_statistics(sum_rating, sum_recommends, len(reviews), dates_d)
+
+
+class StatisticsEngine:
+    """
+    Computes statistics of product or shop reviews with avg/terms/date_histogram aggregations.
+    """
+
+    def __init__(self, search: ReviewSearch):
+        """
+        Constructor method.
+        :param search: search in reviews of product or shop
+        """
+        self.search = search
+        self.connector = search.connector
+
+    def statistics(self, name: str, domain: str):
+        """
+        Compute statistics of product or shop.
+        :param name: name of product or shop
+        :param domain: domain of product or 'shop'
+        :return: dict of statistics or None if there are no reviews
+        """
+        index, query = self.search.target(name, domain)
+        body = {
+            'size': 0,
+            'track_total_hits': True,
+            'query': query,
+            'aggs': {
+                'rating': {'terms': {'field': 'rating', 'size': 1000, 'missing': MISSING}},
+                'recommends': {'filter': {'term': {'recommends': 'YES'}}},
+                'months': {
+                    'date_histogram': {'field': 'date', 'calendar_interval': 'month', 'format': 'yyyy-MM-dd',
+                                       'min_doc_count': 1},
+                    'aggs': {'label': {'top_hits': {'size': 1, '_source': ['date_str']}}},
+                },
+            },
+        }
+        res = self.connector.es.search(index=index, body=body)
+        count = res['hits']['total']
+        if isinstance(count, dict):
+            count = count['value']
+        if not count:
+            return None
+
+        aggs = res['aggregations']
+        sum_rating = 0
+        malformed = []
+        for bucket in aggs['rating']['buckets']:
+            rating = parse_rating(bucket['key'])
+            if rating is None:
+                malformed.append(bucket['key'])
+            else:
+                sum_rating += rating * bucket['doc_count']
+
+        sum_recommends = aggs['recommends']['doc_count']
+        dates_d = {}
+        for bucket in aggs['months']['buckets']:
+            hits = bucket['label']['hits']['hits']
+            dates_d[bucket['key_as_string']] = {
+                'month': month_label(hits[0]['_source']) if hits else bucket['key_as_string'],
+                'cnt': bucket['doc_count'],
+            }
+
+        # reviews with malformed rating are not counted into histogram and recommends, remove them in python
+        if malformed:
+            for review in self.__malformed_reviews(index, query, malformed):
+                try:
+                    if review.get('recommends') == 'YES':
+                        sum_recommends -= 1
+                    key = month_key(review)
+                    if key in dates_d:
+                        dates_d[key]['cnt'] -= 1
+                except Exception as e:
+                    print('StatisticsEngine-statistics: {}'.format(str(e)), file=sys.stderr)
+
+        return format_statistics(sum_rating, sum_recommends, count, dates_d)
+
+    def __malformed_reviews(self, index: str, query: dict, ratings: list):
+        """
+        Get reviews, which rating is one of malformed ratings or missing.
+        :param index: index of reviews
+        :param query: query of product/shop reviews
+        :param ratings: list of malformed rating values (MISSING for reviews without rating)
+        :return: list of review sources
+        """
+        should = [{'terms': {'rating': [r for r in ratings if r != MISSING]}}]
+        if MISSING in ratings:
+            should.append({'bool': {'must_not': {'exists': {'field': 'rating'}}}})
+
+        body = {
+            'size': 10000,
+            '_source': ['recommends', 'date'],
+            'query': {'bool': {'filter': [query], 'should': should, 'minimum_should_match': 1}},
+        }
+        res = self.connector.es.search(index=index, body=body)
+        return [hit['_source'] for hit in res['hits']['hits']]
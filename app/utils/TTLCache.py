@@ -0,0 +1,96 @@
+"""
+This file contains implementation of TTLCache class, in-process cache with time to live of entries, maximum size
+with least recently used eviction and hit/miss counters.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread safe key-value cache, entries expire after ttl seconds, least recently used entries are evicted above
+    max_size.
+    """
+
+    def __init__(self, ttl: float = 300, max_size: int = 1024):
+        """
+        Constructor method.
+        :param ttl: time to live of entry in seconds, 0 means entries do not expire
+        :param max_size: maximum count of entries
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        Get value of key, expired entries are removed.
+        :param key:
+        :param default: value returned on miss
+        :return: cached value or default
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl and time.monotonic() - entry[1] > self.ttl):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and not (self.ttl and time.monotonic() - entry[1] > self.ttl)
+
+    def set(self, key, value):
+        """
+        Store value of key, least recently used entries are evicted above max_size.
+        :param key:
+        :param value:
+        """
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        """
+        Remove key from cache.
+        :param key:
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        Get cache statistics.
+        :return: dict
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,72 @@
+"""
+This file contains implementation of TaggerPool class, which performs pos tagging of sentences in pool of processes.
+Each worker process loads its own morphological tagger once, sentences are sent in chunks and results are returned in
+the same order as sentences. Worker functions live in module tagger_worker outside of app package.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from tagger_worker import init_worker, tag_chunk, tag_sentence
+
+
+class TaggerPool:
+    """
+    Pool of worker processes with morphological taggers. Small inputs are tagged in the calling process.
+    """
+
+    def __init__(self, tagger_path: str, workers: int = 1, chunk_size: int = 256):
+        """
+        Constructor method, processes are started on first parallel tagging.
+        :param tagger_path: path to tagger model
+        :param workers: count of worker processes, 1 disables parallel tagging
+        :param chunk_size: count of sentences sent to worker at once
+        """
+        self.tagger_path = tagger_path
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.executor = None
+
+    def __get_executor(self):
+        """
+        Create pool of processes. Processes are spawned, forking of application with running threads and loaded models
+        could deadlock the child, spawned worker imports only module tagger_worker.
+        :return: ProcessPoolExecutor
+        """
+        if not self.executor:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=init_worker, initargs=(self.tagger_path,))
+        return self.executor
+
+    def tag(self, sentences: list, local_tag, progress=None):
+        """
+        Perform pos tagging of sentences.
+        :param sentences: list of texts
+        :param local_tag: callable(sentence) -> (count, lemmas) used when tagging in the calling process
+        :param progress: callable(count of tagged sentences), may raise to stop tagging
+        :return: list of (count of sentences, lemmas) in order of sentences
+        """
+        progress = progress or (lambda n: None)
+        if self.workers <= 1 or len(sentences) <= self.chunk_size:
+            results = []
+            for sentence in sentences:
+                results.append(local_tag(sentence))
+                progress(1)
+            return results
+
+        executor = self.__get_executor()
+        chunks = [sentences[i:i + self.chunk_size] for i in range(0, len(sentences), self.chunk_size)]
+        futures = [executor.submit(tag_chunk, chunk) for chunk in chunks]
+        results = []
+        try:
+            for chunk, future in zip(chunks, futures):
+                results += future.result()
+                progress(len(chunk))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+        return results
@@ -0,0 +1,56 @@
+"""
+This file contains implementation of TreeIndex class, which indexes tree exported from anytree as dictionary by path of
+node names, so that children of any node can be returned without traversing or serializing the whole tree.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+
+
+class TreeIndex:
+    """
+    Index of tree nodes by path of names from root.
+    """
+
+    def __init__(self, tree: dict, version: str = ''):
+        """
+        Constructor method indexes all nodes of tree.
+        :param tree: root node as dictionary with name and children keys
+        :param version: version of tree (ETag of serialized tree)
+        """
+        self.version = version
+        self.root = tree
+        self.nodes = {}
+        stack = [((), tree)]
+        while stack:
+            path, node = stack.pop()
+            self.nodes[path] = node
+            for child in node.get('children', []):
+                stack.append((path + (child['name'],), child))
+
+    @staticmethod
+    def summary(node: dict):
+        """
+        Get node without its children, with count of children.
+        :param node:
+        :return: dict
+        """
+        d = {key: value for key, value in node.items() if key != 'children'}
+        d['child_count'] = len(node.get('children', []))
+        return d
+
+    def children(self, path: list):
+        """
+        Get node on path and summaries of its children.
+        :param path: list of node names without root, empty list is the root
+        :return: dict or None if path does not exist
+        """
+        node = self.nodes.get(tuple(path))
+        if node is None:
+            return None
+
+        return {
+            'path': list(path),
+            'node': self.summary(node),
+            'children': [self.summary(child) for child in node.get('children', [])],
+            'version': self.version,
+        }
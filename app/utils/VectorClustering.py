@@ -0,0 +1,194 @@
+"""
+This file contains implementation of clustering of precomputed sentence vectors with the same embedding types as
+FastTextModel: sentence vectors, distance matrix and similarity matrix of sentences. Dense n x n matrices are used only
+if they fit into memory cap, otherwise rows of matrices are approximated by similarities to landmark sentences, which
+are computed blockwise in float32 and clustered by mini-batch k-means.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+from review_analysis.clasification.fasttext_model import EmbeddingType, ClusterMethod
+
+
+def normalize(vectors: np.ndarray):
+    """
+    Normalize rows of matrix to unit length.
+    :param vectors: matrix [n, dim]
+    :return: float32 matrix [n, dim]
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def features(vectors: np.ndarray, embedding_type: EmbeddingType, columns: np.ndarray = None):
+    """
+    Convert sentence vectors to clustering features according to embedding type.
+    :param vectors: matrix [n, dim]
+    :param embedding_type:
+    :param columns: normalized vectors of sentences, which are columns of distance/similarity matrix (all sentences
+    if None)
+    :return: matrix [n, dim] for sentence vectors, [n, columns] for distance/similarity matrix
+    """
+    if embedding_type == EmbeddingType.sentence_vectors:
+        return vectors
+
+    normalized = normalize(vectors)
+    similarity = normalized @ (normalized if columns is None else columns).T
+    if embedding_type == EmbeddingType.distance_matrix:
+        return 1.0 - similarity
+    return similarity
+
+
+def _blocks(n: int, block_rows: int):
+    """
+    Split range of rows into blocks.
+    :param n: count of rows
+    :param block_rows: count of rows in block
+    :return: generator of slices
+    """
+    for start in range(0, n, block_rows):
+        yield slice(start, min(start + block_rows, n))
+
+
+def cluster_vectors(vectors: np.ndarray, embedding_type: EmbeddingType, cluster_method: ClusterMethod,
+                    cluster_cnt: int, memory_cap: int = 2 * 1024 ** 3, max_landmarks: int = 2048,
+                    random_state: int = 0):
+    """
+    Cluster sentence vectors, clustering mode is chosen according to memory needed by features:
+        dense: whole feature matrix fits into memory cap, k-means
+        landmarks: distance/similarity to at most max_landmarks sampled sentences, computed blockwise, mini-batch
+        k-means
+        minibatch: sentence vectors do not fit into memory cap, mini-batch k-means over blocks
+    :param vectors: matrix [n, dim]
+    :param embedding_type:
+    :param cluster_method:
+    :param cluster_cnt: count of clusters
+    :param memory_cap: maximum size of feature matrix in bytes
+    :param max_landmarks: maximum count of landmark sentences
+    :param random_state: seed of landmark sampling and k-means
+    :return: list of cluster labels, dictionary describing chosen mode
+    """
+    if cluster_method != ClusterMethod.kmeans:
+        raise KeyError('cluster_method')
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = len(vectors)
+    cluster_cnt = min(cluster_cnt, n)
+    columns = vectors.shape[1] if embedding_type == EmbeddingType.sentence_vectors else n
+
+    if n * columns * 4 <= memory_cap:
+        kmeans = KMeans(n_clusters=cluster_cnt, random_state=random_state)
+        labels = kmeans.fit_predict(features(vectors, embedding_type))
+        return labels.tolist(), {'mode': 'dense', 'features': columns}
+
+    landmarks = None
+    mode = 'minibatch'
+    if embedding_type != EmbeddingType.sentence_vectors:
+        mode = 'landmarks'
+        rng = np.random.RandomState(random_state)
+        columns = max(cluster_cnt, min(n, max_landmarks))
+        landmarks = normalize(vectors[rng.choice(n, columns, replace=False)])
+
+    block_rows = max(cluster_cnt, memory_cap // (columns * 4))
+    kmeans = MiniBatchKMeans(n_clusters=cluster_cnt, random_state=random_state, batch_size=min(block_rows, 4096))
+    # every block is read three times: two partial_fit epochs and predict pass, feature matrix is never materialized
+    for _ in range(2):
+        for block in _blocks(n, block_rows):
+            kmeans.partial_fit(features(vectors[block], embedding_type, landmarks))
+    labels = np.concatenate([kmeans.predict(features(vectors[block], embedding_type, landmarks))
+                             for block in _blocks(n, block_rows)])
+
+    return labels.tolist(), {'mode': mode, 'features': columns, 'block_rows': block_rows}
+
+
+def assignment_metric(embedding_type: EmbeddingType):
+    """
+    Get metric of assignment to the nearest centroid consistent with clustering features: k-means clusters sentence
+    vectors in euclidean space, rows of distance/similarity matrices are derived from cosine similarity.
+    :param embedding_type:
+    :return: 'euclidean' or 'cosine'
+    """
+    return 'euclidean' if embedding_type == EmbeddingType.sentence_vectors else 'cosine'
+
+
+def centroids(vectors: np.ndarray, labels: np.ndarray, count: int, metric: str = 'cosine'):
+    """
+    Compute centroids of vectors per label, cosine centroids are unit length means of normalized vectors.
+    :param vectors: matrix [n, dim]
+    :param labels: array of labels from range 0 .. count - 1
+    :param count: count of labels
+    :param metric: 'cosine' or 'euclidean'
+    :return: float32 matrix [count, dim]
+    """
+    sums = np.zeros((count, vectors.shape[1]), dtype=np.float32)
+    if metric == 'cosine':
+        np.add.at(sums, labels, normalize(vectors))
+        return normalize(sums)
+    np.add.at(sums, labels, np.asarray(vectors, dtype=np.float32))
+    counts = np.bincount(labels, minlength=count).astype(np.float32)
+    return sums / np.maximum(counts, 1.0)[:, None]
+
+
+def assign_nearest(vectors: np.ndarray, centers: np.ndarray, block_rows: int = 65536, metric: str = 'cosine'):
+    """
+    Assign vectors to the nearest center, distances are computed blockwise.
+    :param vectors: matrix [n, dim]
+    :param centers: matrix [k, dim] from centroids with the same metric
+    :param block_rows: count of vectors in block
+    :param metric: 'cosine' or 'euclidean'
+    :return: array of indexes of nearest centers, array of distances to them
+    """
+    nearest = np.empty(len(vectors), dtype=np.int64)
+    distances = np.empty(len(vectors), dtype=np.float32)
+    squared_centers = (centers ** 2).sum(axis=1)
+    for block in _blocks(len(vectors), block_rows):
+        if metric == 'cosine':
+            block_distances = 1.0 - normalize(vectors[block]) @ centers.T
+        else:
+            block_vectors = np.asarray(vectors[block], dtype=np.float32)
+            squared = (block_vectors ** 2).sum(axis=1)[:, None] - 2.0 * block_vectors @ centers.T + squared_centers
+            block_distances = np.sqrt(np.maximum(squared, 0.0))
+        nearest[block] = block_distances.argmin(axis=1)
+        distances[block] = block_distances.min(axis=1)
+    return nearest, distances
+
+
+def stratified_sample(strata: list, size: int, random_state: int = 0):
+    """
+    Draw sample of items with count from each stratum proportional to its size.
+    :param strata: stratum key of each item
+    :param size: size of sample
+    :param random_state: seed of sampling
+    :return: sorted array of sampled indexes
+    """
+    rng = np.random.RandomState(random_state)
+    groups = {}
+    for index, key in enumerate(strata):
+        groups.setdefault(key, []).append(index)
+    keys = list(groups)
+    quotas = np.array([len(groups[key]) for key in keys]) * size / len(strata)
+    counts = np.floor(quotas).astype(int)
+    # remaining items go to strata with the largest fractional part of quota
+    for i in np.argsort(counts - quotas)[:size - counts.sum()]:
+        counts[i] += 1
+    sample = [rng.choice(groups[key], count, replace=False) for key, count in zip(keys, counts) if count]
+    return np.sort(np.concatenate(sample))
+
+
+def distance_stats(distances: np.ndarray):
+    """
+    Summarize distances of assigned vectors to their centers.
+    :param distances: array of distances
+    :return: dictionary with mean, median, 90th percentile and maximum
+    """
+    if not len(distances):
+        return {}
+    return {
+        'mean': round(float(distances.mean()), 4),
+        'median': round(float(np.median(distances)), 4),
+        'p90': round(float(np.percentile(distances, 90)), 4),
+        'max': round(float(distances.max()), 4),
+    }
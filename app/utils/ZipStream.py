@@ -0,0 +1,88 @@
+"""
+This file contains implementation of streamed zip archive creation. Archive is written into non seekable buffer and
+its content is yielded in chunks while files are still being written, so that the whole archive is never held in memory.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import io
+import zipfile
+
+from .Exceptions import WrongProperty
+
+COMPRESSIONS = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+# zstandard in zip is available since python 3.14
+if hasattr(zipfile, 'ZIP_ZSTANDARD'):
+    COMPRESSIONS['zstd'] = zipfile.ZIP_ZSTANDARD
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """
+    Write only, non seekable buffer, from which written bytes are taken out in chunks.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def write(self, b):
+        b = bytes(b)
+        self.chunks.append(b)
+        self.size += len(b)
+        self.position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.position
+
+    def pop(self):
+        """
+        Take out all written bytes.
+        :return: bytes
+        """
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+def get_compression(name: str):
+    """
+    Convert compression name to zipfile constant.
+    :param name: stored/deflate/bzip2/lzma/zstd
+    :return: zipfile compression constant
+    """
+    try:
+        return COMPRESSIONS[name]
+    except KeyError:
+        raise WrongProperty('Unsupported compression {}, use one of: {}'.format(name, ', '.join(COMPRESSIONS)))
+
+
+def stream_zip(files, compression: str = 'deflate', chunk_size: int = 64 * 1024):
+    """
+    Generate zip archive from files in chunks.
+    :param files: iterable of (file name, iterable of str rows)
+    :param compression: name of compression method
+    :param chunk_size: minimal size of yielded chunk in bytes
+    :return: generator of bytes
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=get_compression(compression)) as z:
+        for name, rows in files:
+            with z.open(name, mode='w', force_zip64=True) as f:
+                for row in rows:
+                    f.write(row.encode('utf-8'))
+                    if buffer.size >= chunk_size:
+                        yield buffer.pop()
+    yield buffer.pop()
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+"""
+This file is used for comparison of fp32 bert models with their int8 dynamically quantized variants. Reviews are
+sampled randomly from domain indexes (optionally only reviews not older than given date, which were not used for
+training) and the report contains label agreement of bipolar models, rating MAE of regression model, throughput and
+size of both variants, so that quantization can be turned on per model by QUANTIZED_MODELS.
+
+    python3 compare_quantization.py --model general --model regression --model elektronika --size 500
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import argparse
+import json
+
+from app import es_con, review_cnt
+from app.config import DOMAIN_INDEXES
+
+
+def sample_reviews(indexes: list, size: int, seed: int, since: str = None):
+    """
+    Draw random sample of reviews.
+    :param indexes: list of indexes with reviews
+    :param size: count of reviews
+    :param seed: seed of random sample
+    :param since: date YYYY-MM-DD, only reviews from this date are sampled
+    :return: list of review dictionaries
+    """
+    query = {'match_all': {}}
+    if since:
+        query = {'range': {'date': {'gte': since}}}
+    body = {
+        'query': {'function_score': {'query': query, 'random_score': {'seed': seed, 'field': '_seq_no'}}},
+        'size': size,
+        '_source': ['pros', 'cons', 'summary'],
+    }
+    res = es_con.es.search(index=','.join(indexes), body=body)
+    return [hit['_source'] for hit in res['hits']['hits']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare fp32 and int8 quantized bert models on sample of reviews.')
+    parser.add_argument('--model', action='append', choices=['general', 'regression'] + DOMAIN_INDEXES,
+                        help='model to be compared, may be repeated, general and regression by default')
+    parser.add_argument('--index', action='append', choices=DOMAIN_INDEXES,
+                        help='domain index of sampled reviews, may be repeated, all domain indexes by default')
+    parser.add_argument('--size', type=int, default=500, help='count of sampled reviews')
+    parser.add_argument('--seed', type=int, default=42, help='seed of random sample')
+    parser.add_argument('--since', metavar='YYYY-MM-DD', help='sample only reviews from this date (held-out data)')
+    args = parser.parse_args()
+
+    reviews = sample_reviews(args.index or DOMAIN_INDEXES, args.size, args.seed, args.since)
+    for name in args.model or ['general', 'regression']:
+        print(json.dumps(review_cnt.compare_quantized(name, reviews)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+"""
+This file is used for offline scoring of reviews. Reviews of domain indexes, which lack rating_model, pos_model or
+con_model, are analysed by the same models as /experiment/review uses, only missing analyses are computed and written
+back with bulk updates. Reviews are read from point in time of index, progress is stored in checkpoint file after each
+page, so that interrupted run continues where it stopped. If point in time expired meanwhile, index is read again from
+the start, already scored reviews do not match query any more.
+
+    python3 score.py --index elektronika --category "Mobilní telefony"
+    python3 score.py --only-new-since 2020-05-01
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+from elasticsearch import NotFoundError
+from elasticsearch.helpers import streaming_bulk
+
+from app import es_con, review_cnt
+from app.config import DOMAIN_INDEXES
+
+analysis_fields = ['rating_model', 'pos_model', 'con_model']
+# time for which point in time of index is kept between pages
+keep_alive = '30m'
+
+
+def build_query(category: str = None, since: str = None):
+    """
+    Create query of reviews, which lack any of analysis fields.
+    :param category: name of subcategory or None for whole index
+    :param since: date YYYY-MM-DD, only reviews from this date are scored
+    :return: query dictionary
+    """
+    query = {
+        'bool': {
+            'should': [{'bool': {'must_not': {'exists': {'field': field}}}} for field in analysis_fields],
+            'minimum_should_match': 1,
+            'filter': [],
+        }
+    }
+    if category:
+        query['bool']['filter'].append({'match_phrase': {'category': category}})
+    if since:
+        query['bool']['filter'].append({'range': {'date': {'gte': since}}})
+    return query
+
+
+def load_checkpoint(path: str, run_key: str):
+    """
+    Load checkpoint of run with the same arguments.
+    :param path: path to checkpoint file
+    :param run_key: hash of arguments of run
+    :return: dict index -> {'pit': id of point in time, 'after': sort values of last review, 'done': bool,
+    'scored': int, 'skipped': int, 'failed': int}
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('run') != run_key:
+        print('Checkpoint {} belongs to run with other arguments, starting from scratch'.format(path),
+              file=sys.stderr)
+        return {}
+    return checkpoint['indexes']
+
+
+def save_checkpoint(path: str, run_key: str, indexes: dict):
+    """
+    Atomically store checkpoint.
+    :param path: path to checkpoint file
+    :param run_key: hash of arguments of run
+    :param indexes: dict index -> progress
+    """
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'run': run_key, 'indexes': indexes}, f)
+    os.replace(tmp, path)
+
+
+def search_page(index: str, query: dict, progress: dict, page_size: int):
+    """
+    Get next page of reviews from point in time of index, point in time is opened on the first page or if the stored
+    one expired.
+    :param index: name of index
+    :param query: query of reviews
+    :param progress: progress of index, pit and after are updated in place
+    :param page_size: count of reviews in page
+    :return: list of hits
+    """
+    body = {
+        'query': query,
+        'size': page_size,
+        'sort': [{'_shard_doc': 'asc'}],
+        '_source': ['pros', 'cons', 'summary', 'model_versions'] + analysis_fields,
+    }
+    if progress.get('pit'):
+        body['pit'] = {'id': progress['pit'], 'keep_alive': keep_alive}
+        if progress.get('after'):
+            body['search_after'] = progress['after']
+        try:
+            res = es_con.es.search(body=body)
+            progress['pit'] = res.get('pit_id', progress['pit'])
+            return res['hits']['hits']
+        except NotFoundError:
+            print('{}: point in time expired, reading index from the start'.format(index), file=sys.stderr)
+            body.pop('search_after', None)
+
+    progress['pit'] = es_con.es.open_point_in_time(index=index, keep_alive=keep_alive)['id']
+    progress['after'] = None
+    body['pit'] = {'id': progress['pit'], 'keep_alive': keep_alive}
+    res = es_con.es.search(body=body)
+    progress['pit'] = res.get('pit_id', progress['pit'])
+    return res['hits']['hits']
+
+
+def score_index(index: str, query: dict, progress: dict, page_size: int, save):
+    """
+    Score all matching reviews of index page by page.
+    :param index: name of index
+    :param query: query of reviews
+    :param progress: progress of index, updated in place
+    :param page_size: count of reviews scored at once
+    :param save: callable() storing checkpoint
+    """
+    start = time.time()
+    scored = 0
+    while True:
+        hits = search_page(index, query, progress, page_size)
+        if not hits:
+            break
+
+        results = review_cnt.score_reviews([hit['_source'] for hit in hits])
+        actions = [{'_op_type': 'update', '_index': hit['_index'], '_id': hit['_id'], 'doc': doc}
+                   for hit, doc in zip(hits, results) if doc]
+        # empty reviews and reviews with current analyses are not updated
+        skipped = len(hits) - len(actions)
+        failed = 0
+        for ok, item in streaming_bulk(es_con.es, actions, raise_on_error=False, raise_on_exception=False):
+            if not ok:
+                failed += 1
+                print('{}: {}'.format(index, str(item.get('update', {}).get('error'))), file=sys.stderr)
+
+        scored += len(actions) - failed
+        progress['after'] = hits[-1]['sort']
+        progress['scored'] = progress.get('scored', 0) + len(actions) - failed
+        progress['skipped'] = progress.get('skipped', 0) + skipped
+        progress['failed'] = progress.get('failed', 0) + failed
+        save()
+        elapsed = time.time() - start
+        rate = scored / elapsed if elapsed else 0.0
+        print('{}: {} reviews scored, {} skipped, {:.1f} reviews/s'.format(index, progress['scored'],
+                                                                         progress['skipped'], rate))
+
+    if progress.get('pit'):
+        es_con.es.close_point_in_time(body={'id': progress.pop('pit')})
+    progress['done'] = True
+    save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute rating_model, pos_model and con_model of reviews, which '
+                                                 'lack them, and write them to elasticsearch.')
+    parser.add_argument('--index', action='append', choices=DOMAIN_INDEXES,
+                        help='domain index to be scored, may be repeated, all domain indexes by default')
+    parser.add_argument('--category', help='score only reviews of subcategory')
+    parser.add_argument('--only-new-since', metavar='YYYY-MM-DD', help='score only reviews from this date')
+    parser.add_argument('--page-size', type=int, default=256, help='count of reviews scored at once')
+    parser.add_argument('--checkpoint', default='score_checkpoint.json', help='path to checkpoint file')
+    parser.add_argument('--restart', action='store_true', help='ignore existing checkpoint')
+    args = parser.parse_args()
+
+    indexes = args.index or DOMAIN_INDEXES
+    query = build_query(args.category, args.only_new_since)
+    run_key = hashlib.sha1(json.dumps([indexes, query], sort_keys=True).encode('utf-8')).hexdigest()
+    checkpoint = {} if args.restart else load_checkpoint(args.checkpoint, run_key)
+
+    start = time.time()
+    total = 0
+    for index in indexes:
+        progress = checkpoint.setdefault(index, {})
+        if progress.get('done'):
+            print('{}: already scored ({} reviews)'.format(index, progress.get('scored', 0)))
+            continue
+        before = progress.get('scored', 0)
+        score_index(index, query, progress, args.page_size,
+                    lambda: save_checkpoint(args.checkpoint, run_key, checkpoint))
+        total += progress['scored'] - before
+
+    # checkpoint is needed only to resume interrupted run
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    elapsed = time.time() - start
+    rate = total / elapsed if elapsed else 0.0
+    print('Scored {} reviews in {:.0f} s, {:.1f} reviews/s'.format(total, elapsed, rate))
+    print(json.dumps(review_cnt.get_models_status()[0]['inference_cache']))
+
+
+if __name__ == '__main__':
+    main()
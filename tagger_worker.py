@@ -0,0 +1,41 @@
+"""
+This file contains functions of pos tagging worker processes of TaggerPool. Workers are spawned, not forked, so this
+module is kept outside of app package, importing it does not load models of the application.
+
+Author: xkloco00@stud.fit.vutbr.cz
+"""
+from review_analysis.utils.morpho_tagger import MorphoTagger
+
+# tagger of worker process
+_tagger = None
+
+
+def init_worker(tagger_path: str):
+    """
+    Load morphological tagger in worker process.
+    :param tagger_path: path to tagger model
+    """
+    global _tagger
+    _tagger = MorphoTagger()
+    _tagger.load_tagger(path=tagger_path)
+
+
+def tag_sentence(tagger: MorphoTagger, sentence: str):
+    """
+    Perform pos tagging of sentence.
+    :param tagger: morphological tagger
+    :param sentence: text of sentence
+    :return: count of sentences found by tagger, list of lemmas of the first sentence
+    """
+    sentence_pos = tagger.pos_tagging(sentence, False) or []
+    lemmas = [wb.lemma for wb in sentence_pos[0]] if sentence_pos else []
+    return len(sentence_pos), lemmas
+
+
+def tag_chunk(sentences: list):
+    """
+    Perform pos tagging of chunk of sentences in worker process.
+    :param sentences: list of texts
+    :return: list of (count of sentences, lemmas)
+    """
+    return [tag_sentence(_tagger, sentence) for sentence in sentences]